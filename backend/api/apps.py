@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class APIConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from recipes.generations import is_shared_cache
+
+        from .v1 import authentication  # noqa: F401
+
+        if settings.AUTH_SIGNED_TOKENS and not is_shared_cache():
+            raise ImproperlyConfigured(
+                'AUTH_SIGNED_TOKENS требует общего кэша CACHE_BACKEND, '
+                'иначе токены не проходят проверку в других процессах '
+                'и не отзываются.'
+            )
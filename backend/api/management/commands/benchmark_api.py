@@ -0,0 +1,329 @@
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from math import ceil
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+PERCENTILES = (50, 95, 99)
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+)
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга."""
+
+    ordered = sorted(values)
+    return ordered[max(ceil(len(ordered) * rank / 100) - 1, 0)]
+
+
+class TestClientTransport:
+    """Запросы через тестовый клиент Django с подсчётом sql-запросов."""
+
+    def __init__(self, token):
+        self.client = Client(
+            SERVER_NAME='localhost',
+            HTTP_AUTHORIZATION=f'Token {token}',
+        )
+
+    def request(self, method, url, body=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                url,
+                data=json.dumps(body) if body is not None else None,
+                content_type='application/json',
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response.status_code, len(queries), response
+
+
+class HTTPTransport:
+    """Запросы к запущенному серверу, например локальному gunicorn."""
+
+    def __init__(self, token, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {
+            'Authorization': f'Token {token}',
+            'Content-Type': 'application/json',
+        }
+
+    def request(self, method, url, body=None):
+        request = urllib.request.Request(
+            self.base_url + url,
+            data=json.dumps(body).encode() if body is not None else None,
+            headers=self.headers,
+            method=method.upper(),
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                content = response.read()
+                status, headers = response.status, response.headers
+        except urllib.error.HTTPError as error:
+            content = error.read()
+            status, headers = error.code, error.headers
+        queries = headers.get('X-DB-Queries')
+        return status, int(queries) if queries else None, content
+
+
+class Command(BaseCommand):
+    """Команда для замера производительности основных эндпоинтов API."""
+
+    help = 'Нагрузочный замер API с перцентилями задержек'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только указанные сценарии.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого идут запросы.',
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Адрес запущенного сервера вместо тестового клиента.',
+        )
+        parser.add_argument('--output', help='Файл для результатов в json.')
+        parser.add_argument(
+            '--compare', help='Файл с результатами предыдущего запуска.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый относительный рост p95 при сравнении.',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Число запросов --requests должно быть >= 1.')
+        self.random = random.Random(options['seed'])
+        self.user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.transport = (
+            HTTPTransport(token.key, options['base_url'])
+            if options['base_url'] else TestClientTransport(token.key)
+        )
+        self.created = []
+        scenarios = self.get_scenarios()
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - set(scenarios)
+            if unknown:
+                raise CommandError(f'Неизвестные сценарии: {unknown}.')
+            scenarios = {
+                name: scenarios[name] for name in options['scenarios']
+            }
+        results = {}
+        try:
+            for name, scenario in scenarios.items():
+                results[name] = self.run_scenario(
+                    scenario, options['requests'], options['warmup']
+                )
+                self.report(name, results[name])
+        finally:
+            self.delete_created()
+        report = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'transport': 'http' if options['base_url'] else 'client',
+                'requests': options['requests'],
+                'recipes': Recipe.objects.count(),
+                'users': User.objects.count(),
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден.')
+            return user
+        user = User.objects.annotate(
+            cart_size=Count('shopping_cart__recipe')
+        ).order_by('-cart_size').first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замера, запустите generate_fake_data.'
+            )
+        return user
+
+    def get_scenarios(self):
+        recipe_ids = list(
+            Recipe.objects.order_by('?').values_list('id', flat=True)[:1000]
+        )
+        tags = list(Tag.objects.values_list('slug', flat=True))
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:1000]
+        )
+        names = list(Ingredient.objects.values_list('name', flat=True)[:1000])
+        authors = list(
+            User.objects.order_by(
+                '-recipes_count'
+            ).values_list('id', flat=True)[:20]
+        )
+        if not (recipe_ids and tags and ingredient_ids):
+            raise CommandError(
+                'Нет данных для замера, запустите generate_fake_data.'
+            )
+
+        def recipe_body():
+            return {
+                'name': f'benchmark {self.random.random()}',
+                'text': 'Рецепт для замера производительности.',
+                'cooking_time': self.random.randint(1, 120),
+                'image': IMAGE,
+                'tags': [Tag.objects.values_list('id', flat=True)[0]],
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': 10}
+                    for ingredient_id in self.random.sample(
+                        ingredient_ids, min(len(ingredient_ids), 8)
+                    )
+                ],
+            }
+
+        def update():
+            if not self.created:
+                self.create_recipe(recipe_body())
+            return (
+                'patch',
+                f'/api/recipes/{self.random.choice(self.created)}/',
+                recipe_body(),
+            )
+
+        return {
+            'recipes_feed': lambda: (
+                'get', f'/api/recipes/?page={self.random.randint(1, 20)}',
+            ),
+            'recipes_feed_tags': lambda: (
+                'get', f'/api/recipes/?tags={self.random.choice(tags)}',
+            ),
+            'recipes_feed_author': lambda: (
+                'get', f'/api/recipes/?author={self.random.choice(authors)}',
+            ),
+            'recipes_favorited': lambda: (
+                'get', '/api/recipes/?is_favorited=1',
+            ),
+            'recipe_detail': lambda: (
+                'get', f'/api/recipes/{self.random.choice(recipe_ids)}/',
+            ),
+            'subscriptions': lambda: (
+                'get', '/api/users/subscriptions/?recipes_limit=3',
+            ),
+            'ingredients_search': lambda: (
+                'get',
+                f'/api/ingredients/?name={self.random.choice(names)[:3]}',
+            ),
+            'shopping_cart_download': lambda: (
+                'get', '/api/recipes/download_shopping_cart/',
+            ),
+            'recipe_create': lambda: ('post', '/api/recipes/', recipe_body()),
+            'recipe_update': update,
+        }
+
+    def create_recipe(self, body):
+        status, _, response = self.transport.request(
+            'post', '/api/recipes/', body
+        )
+        if status == 201:
+            self.created.append(self.get_id(response))
+
+    def delete_created(self):
+        """Удаляет созданные при замере рецепты через API.
+
+        Так же, как при обычном удалении, уменьшаются счётчики рецептов
+        автора и пересчитываются списки покупок.
+        """
+
+        for recipe_id in self.created:
+            self.transport.request('delete', f'/api/recipes/{recipe_id}/')
+
+    def get_id(self, response):
+        content = getattr(response, 'content', response)
+        return json.loads(content)['id']
+
+    def run_scenario(self, scenario, requests, warmup):
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for index in range(warmup + requests):
+            method, url, *body = scenario()
+            start = time.perf_counter()
+            status, query_count, response = self.transport.request(
+                method, url, *body
+            )
+            elapsed = time.perf_counter() - start
+            if method == 'post' and status == 201:
+                self.created.append(self.get_id(response))
+            if index < warmup:
+                started = time.perf_counter()
+                continue
+            latencies.append(elapsed * 1000)
+            if query_count is not None:
+                queries.append(query_count)
+            errors += status >= 400
+        total = time.perf_counter() - started
+        result = {
+            f'p{rank}': round(percentile(latencies, rank), 2)
+            for rank in PERCENTILES
+        }
+        result.update(
+            mean=round(sum(latencies) / len(latencies), 2),
+            throughput=round(requests / total, 2),
+            queries=(
+                round(sum(queries) / len(queries), 2) if queries else None
+            ),
+            errors=errors,
+        )
+        return result
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<24} p50={result["p50"]:>8}ms p95={result["p95"]:>8}ms '
+            f'p99={result["p99"]:>8}ms rps={result["throughput"]:>8} '
+            f'queries={result["queries"]} errors={result["errors"]}'
+        )
+
+    def compare(self, results, path, threshold):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['scenarios']
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if result['p95'] > previous['p95'] * (1 + threshold):
+                regressions.append(
+                    f'{name}: p95 {previous["p95"]}ms -> {result["p95"]}ms'
+                )
+            if (result['queries'] or 0) > (previous['queries'] or 0):
+                regressions.append(
+                    f'{name}: запросов {previous["queries"]} -> '
+                    f'{result["queries"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Обнаружены регрессии:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не обнаружено.'))
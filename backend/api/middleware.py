@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.queries')
+current_stats = ContextVar('query_stats', default=None)
+
+
+class QueryBudgetError(Exception):
+    """Вью выполнило больше sql-запросов, чем для него заявлено."""
+
+
+class QueryStats:
+    """Счётчик sql-запросов и суммарного времени их выполнения."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.monotonic() - start
+
+
+@contextmanager
+def count_queries(stats):
+    """Считает sql-запросы всех соединений текущего потока в stats."""
+
+    with ExitStack() as stack:
+        if stats is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+        yield
+
+
+def get_query_budget(view_func, request):
+    """Бюджет запросов, заявленный атрибутом query_budget класса вью.
+
+    Бюджет задаётся числом или словарём, ключами которого служат
+    действия вьюсета или http-методы.
+    """
+
+    budget = getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    if not isinstance(budget, dict):
+        return budget
+    method = request.method.lower()
+    action = (getattr(view_func, 'actions', None) or {}).get(method)
+    return budget.get(action, budget.get(method))
+
+
+class QueryBudgetMiddleware:
+    """Подсчёт sql-запросов каждого запроса и контроль их бюджета.
+
+    Запросы, выполненные при отдаче потокового ответа, не учитываются.
+    Под ASGI счётчик передаётся через contextvar и подключается в потоках,
+    где асинхронные вью выполняют обращения к БД.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = QueryStats()
+        request.query_budget = None
+        with count_queries(stats):
+            response = self.get_response(request)
+        return self.check_budget(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        request.query_budget = None
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.check_budget(request, response, stats)
+
+    def check_budget(self, request, response, stats):
+        if settings.DEBUG:
+            response['X-DB-Queries'] = stats.count
+            response['X-DB-Time'] = f'{stats.duration * 1000:.1f}ms'
+        budget = request.query_budget
+        if budget is not None and stats.count > budget:
+            message = (
+                f'{request.method} {request.path}: {stats.count} sql-запросов '
+                f'({stats.duration * 1000:.1f}ms) при бюджете {budget}.'
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetError(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func, request)
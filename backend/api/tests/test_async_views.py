@@ -0,0 +1,43 @@
+import threading
+
+from asgiref.sync import async_to_sync
+from django.http import StreamingHttpResponse
+from django.test import TransactionTestCase
+
+from api.v1.async_views import STREAM_BUFFER_SIZE, StreamingASGIHandler
+from recipes.models import Tag
+
+PARTS = 100
+
+
+class StreamingHandlerTests(TransactionTestCase):
+    """Потоковые ответы под ASGI перебираются в пуле и не копятся целиком."""
+
+    def setUp(self):
+        self.produced = 0
+        self.lead = 0
+        self.body = []
+
+    def generate(self):
+        thread = threading.get_ident()
+        yield str(Tag.objects.count()).encode()
+        for number in range(PARTS):
+            self.produced += 1
+            yield b'%d;' % number
+        assert threading.get_ident() == thread
+
+    async def send(self, message):
+        if message['type'] == 'http.response.body':
+            self.body.append(message.get('body', b''))
+            self.lead = max(self.lead, self.produced - len(self.body))
+
+    def test_streaming_response_is_iterated_in_pool(self):
+        response = StreamingHttpResponse(self.generate())
+        async_to_sync(StreamingASGIHandler().send_response)(
+            response, self.send
+        )
+        self.assertEqual(
+            b''.join(self.body),
+            b'0' + b''.join(b'%d;' % number for number in range(PARTS)),
+        )
+        self.assertLessEqual(self.lead, STREAM_BUFFER_SIZE + 2)
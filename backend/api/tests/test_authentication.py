@@ -0,0 +1,120 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.v1.authentication import local_cache, sign_token
+
+User = get_user_model()
+PASSWORD = 'Old-password-123'
+NEW_PASSWORD = 'New-password-456'
+
+
+class CachedTokenAuthenticationTests(TransactionTestCase):
+    """Кэш пользователей по токену не отдаёт устаревших данных."""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+            password=PASSWORD,
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.follower = User.objects.create_user(
+            email='follower@example.com',
+            username='follower',
+            first_name='Подписчик',
+            last_name='Автора',
+            password=PASSWORD,
+        )
+        self.follower_client = APIClient()
+        self.follower_client.force_authenticate(self.follower)
+
+    def get_me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_counters_are_fresh_for_cached_user(self):
+        self.assertEqual(self.get_me().json()['followers_count'], 0)
+        self.follower_client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(self.get_me().json()['followers_count'], 1)
+
+    def test_password_change_keeps_counters(self):
+        self.get_me()
+        self.follower_client.post(f'/api/users/{self.user.id}/subscribe/')
+        response = self.client.post(
+            '/api/users/set_password/',
+            {'current_password': PASSWORD, 'new_password': NEW_PASSWORD},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.followers_count, 1)
+        self.assertTrue(self.user.check_password(NEW_PASSWORD))
+
+    def test_logout_revokes_cached_token(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        self.assertEqual(
+            self.client.post('/api/auth/token/logout/').status_code, 204
+        )
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_profile_change_is_visible(self):
+        self.get_me()
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        self.assertEqual(self.get_me().json()['first_name'], 'Новое имя')
+
+
+@override_settings(AUTH_SIGNED_TOKENS=True)
+class SignedTokenTests(TransactionTestCase):
+    """Подписанные токены отзываются без обращения к БД при проверке."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='admin@example.com',
+            username='admin',
+            first_name='Админ',
+            last_name='Сайта',
+            password=PASSWORD,
+            is_staff=True,
+            is_superuser=True,
+        )
+        Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {sign_token(self.user)}'
+        )
+
+    def test_signed_token_authenticates(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_demotion_revokes_signed_token(self):
+        self.user.is_staff = False
+        self.user.is_superuser = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_logout_revokes_signed_token(self):
+        self.assertEqual(
+            self.client.post('/api/auth/token/logout/').status_code, 204
+        )
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_local_cache_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            apps.get_app_config('api').ready()
@@ -0,0 +1,89 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+URL = '/api/recipes/bulk/'
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2), (200, 30, 30)).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class BulkImportTests(TransactionTestCase):
+    """Пакетный импорт проверяет рецепты так же, как создание по одному."""
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        self.user = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='dinner'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+
+    def make_recipe(self, **fields):
+        return {
+            'name': 'Суп',
+            'text': 'Сварить.',
+            'cooking_time': 30,
+            'image': make_image(),
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 10}],
+            **fields,
+        }
+
+    def post(self, items):
+        return self.client.post(URL, items, format='json')
+
+    def test_malformed_relations_are_item_errors(self):
+        response = self.post([
+            self.make_recipe(tags=5, ingredients=3),
+            self.make_recipe(),
+        ])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(len(data['created']), 1)
+        self.assertEqual(
+            [error['index'] for error in data['errors']], [0]
+        )
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_string_ids_are_accepted(self):
+        response = self.post([self.make_recipe(
+            tags=[str(self.tag.id)],
+            ingredients=[{'id': str(self.ingredient.id), 'amount': '10'}],
+        )])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['errors'], [])
+        recipe = Recipe.objects.get()
+        self.assertEqual(
+            list(recipe.tags.values_list('id', flat=True)), [self.tag.id]
+        )
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class RecipeLastModifiedTests(TransactionTestCase):
+    """Last-Modified рецепта не даёт 304 на изменившийся ответ."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Борщ',
+            text='Сварить.',
+            cooking_time=60,
+            image='recipes/borsch.png',
+        )
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.reader = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Читатель',
+            last_name='Рецептов',
+        )
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(self.reader)
+
+    def test_favorite_changes_last_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.reader_client.post(f'{self.url}favorite/')
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['favorites_count'], 1)
+
+    def test_unchanged_recipe_is_not_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified_for_authenticated(self):
+        response = self.reader_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('ETag', response)
+
+    def test_invalid_pk_with_if_modified_since(self):
+        response = self.client.get(
+            '/api/recipes/abc/',
+            HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 2015 00:00:00 GMT',
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,44 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Subscribe
+
+User = get_user_model()
+
+
+class CounterTests(TransactionTestCase):
+    """Счётчики переживают строки, созданные в обход них."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        self.follower = User.objects.create_user(
+            email='follower@example.com',
+            username='follower',
+            first_name='Подписчик',
+            last_name='Автора',
+        )
+        Subscribe.objects.create(user=self.follower, author=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.follower)
+        self.url = f'/api/users/{self.author.id}/subscribe/'
+
+    def test_unsubscribe_does_not_go_below_zero(self):
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_reconcile_fills_counters(self):
+        call_command('reconcile_counters', stdout=io.StringIO())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
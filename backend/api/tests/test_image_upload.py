@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class RecipeImageUploadTests(TransactionTestCase):
+    """Загрузка фото отклоняет запросы по заголовкам до чтения тела."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        recipe = Recipe.objects.create(
+            author=author,
+            name='Суп',
+            text='Сварить.',
+            cooking_time=30,
+            image='recipes/soup.png',
+        )
+        self.url = f'/api/recipes/{recipe.id}/image/'
+        self.client = APIClient()
+        self.client.force_authenticate(author)
+
+    def test_malformed_content_length_is_bad_request(self):
+        for content_length in ('abc', '-1'):
+            with self.subTest(content_length=content_length):
+                response = self.client.put(
+                    self.url,
+                    b'image',
+                    content_type='image/png',
+                    CONTENT_LENGTH=content_length,
+                    HTTP_CONTENT_DISPOSITION='attachment; filename=soup.png',
+                )
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from recipes.generations import bump_generation
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+URL = '/api/ingredients/'
+
+
+class IngredientSearchTests(TransactionTestCase):
+    """Поиск ингредиентов видит изменения, сделанные другими процессами."""
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def search(self, **extra):
+        return self.client.get(URL, {'name': 'со'}, **extra)
+
+    def test_index_reloads_on_generation_change(self):
+        response = self.search()
+        self.assertEqual(response.json(), [])
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='соль', measurement_unit='г')]
+        )
+        bump_generation('ingredients')
+        response = self.search(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['name'] for item in response.json()], ['соль']
+        )
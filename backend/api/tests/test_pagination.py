@@ -0,0 +1,61 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from recipes.models import Recipe
+
+User = get_user_model()
+URL = '/api/recipes/'
+PARAMS = {'pagination': 'cursor', 'limit': 1}
+
+
+def make_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+class KeysetPaginationTests(TransactionTestCase):
+    """Курсор из запроса проверяется до обращения к БД."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        for name in ('Борщ', 'Щи'):
+            Recipe.objects.create(
+                author=author,
+                name=name,
+                text='Сварить.',
+                cooking_time=60,
+                image='recipes/soup.png',
+            )
+
+    def get_page(self, cursor):
+        return self.client.get(URL, {**PARAMS, 'cursor': cursor})
+
+    def test_next_cursor_returns_next_page(self):
+        first = self.client.get(URL, PARAMS).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 1)
+        self.assertNotEqual(
+            first['results'][0]['id'], second['results'][0]['id']
+        )
+
+    def test_malformed_cursors_are_rejected(self):
+        cursors = (
+            'not-base64!',
+            make_cursor({'p': ['garbage', 1], 'r': False}),
+            make_cursor({'p': [None, None], 'r': False}),
+            make_cursor({'p': ['2023-01-01T00:00:00Z'], 'r': False}),
+            make_cursor({'p': 1, 'r': False}),
+            make_cursor(['p', 'r']),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.get_page(cursor).status_code, 404)
@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem)
+
+User = get_user_model()
+
+
+class ShoppingListRebuildTests(TransactionTestCase):
+    """Пересчёт списков покупок пачками даёт те же суммы, что и корзины."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        self.recipe = Recipe.objects.create(
+            author=author,
+            name='Суп',
+            text='Сварить.',
+            cooking_time=30,
+            image='recipes/soup.png',
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=5
+        )
+        for number in range(3):
+            user = User.objects.create_user(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            client = APIClient()
+            client.force_authenticate(user)
+            client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def amounts(self):
+        return list(
+            ShoppingListItem.objects.values_list('amount', flat=True)
+        )
+
+    def test_rebuild_in_batches_keeps_amounts(self):
+        self.assertEqual(self.amounts(), [5, 5, 5])
+        ShoppingListItem.objects.update(amount=1)
+        with mock.patch('recipes.managers.REBUILD_BATCH_SIZE', 2):
+            ShoppingListItem.objects.rebuild()
+        self.assertEqual(self.amounts(), [5, 5, 5])
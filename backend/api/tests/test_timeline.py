@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, TimelineEntry
+from recipes.tasks import fan_out_recipe
+
+User = get_user_model()
+URL = '/api/recipes/timeline/'
+
+
+def make_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com',
+        username=name,
+        first_name='Имя',
+        last_name='Фамилия',
+    )
+
+
+class TimelineTests(TransactionTestCase):
+    """Рецепт виден в ленте подписчика независимо от рассылки по лентам."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.follower = make_user('follower')
+        self.client = APIClient()
+        self.client.force_authenticate(self.follower)
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.author.refresh_from_db()
+
+    def publish(self):
+        return Recipe.objects.create(
+            author=self.author,
+            name='Суп',
+            text='Сварить.',
+            cooking_time=30,
+            image='recipes/soup.png',
+            merged_on_read=True,
+        )
+
+    def timeline_ids(self):
+        return [
+            recipe['id']
+            for recipe in self.client.get(URL).json()['results']
+        ]
+
+    def test_pending_recipe_is_merged_on_read(self):
+        recipe = self.publish()
+        self.assertEqual(self.timeline_ids(), [recipe.id])
+        fan_out_recipe(recipe.id, self.author.id, 1)
+        recipe.refresh_from_db()
+        self.assertFalse(recipe.merged_on_read)
+        self.assertTrue(TimelineEntry.objects.filter(recipe=recipe).exists())
+        self.assertEqual(self.timeline_ids(), [recipe.id])
+
+    def test_recipe_stays_after_author_drops_below_threshold(self):
+        with override_settings(TIMELINE_FANOUT_THRESHOLD=0):
+            recipe = self.publish()
+            fan_out_recipe(recipe.id, self.author.id, 1)
+            self.assertEqual(self.timeline_ids(), [recipe.id])
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.timeline_ids(), [recipe.id])
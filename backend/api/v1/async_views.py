@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from api.middleware import count_queries, current_stats
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_WORKERS, thread_name_prefix='orm'
+)
+STREAM_BUFFER_SIZE = 16
+STREAM_END = object()
+
+
+def call_view(view, request, *args, **kwargs):
+    """Выполняет синхронную вью целиком, вместе с отрисовкой ответа.
+
+    Потоковые ответы здесь не вычитываются: их перебирает
+    StreamingASGIHandler.
+    """
+
+    close_old_connections()
+    try:
+        with count_queries(current_stats.get()):
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+async def run_sync(function, *args, **kwargs):
+    """Выполняет блокирующую функцию в ограниченном пуле потоков.
+
+    Размер пула ASYNC_DB_WORKERS ограничивает и число соединений с БД
+    у одного процесса.
+    """
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor, partial(context.run, function, *args, **kwargs)
+    )
+
+
+def offload(view):
+    """Асинхронная обёртка синхронной вью.
+
+    Медленные клиенты ждут в цикле событий, не занимая потоков, а потоки
+    пула заняты только на время обращений к БД и подготовки ответа.
+    """
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await run_sync(call_view, view, request, *args, **kwargs)
+
+    return async_view
+
+
+def offload_patterns(patterns):
+    """Маршруты, вью которых выполняются асинхронно при ASYNC_VIEWS."""
+
+    if not settings.ASYNC_VIEWS:
+        return patterns
+    return [
+        URLPattern(
+            pattern.pattern,
+            offload(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        ) if isinstance(pattern, URLPattern) else pattern
+        for pattern in patterns
+    ]
+
+
+def produce(iterator, queue, loop, stopped):
+    """Перебирает потоковый ответ в потоке пула, складывая части в очередь.
+
+    Генераторы ответов держат курсор соединения своего потока, поэтому
+    весь перебор выполняется в одном потоке.
+    """
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    close_old_connections()
+    try:
+        for part in iterator:
+            put(part)
+            if stopped.is_set():
+                break
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+        close_old_connections()
+        put(STREAM_END)
+
+
+async def iterate_in_pool(iterable):
+    """Асинхронный перебор синхронного итератора в пуле потоков.
+
+    Очередь из STREAM_BUFFER_SIZE частей ограничивает память, которую
+    занимает ответ медленному клиенту.
+    """
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(STREAM_BUFFER_SIZE)
+    stopped = threading.Event()
+    producer = asyncio.ensure_future(
+        run_sync(produce, iter(iterable), queue, loop, stopped)
+    )
+    try:
+        while True:
+            part = await queue.get()
+            if part is STREAM_END:
+                break
+            yield part
+        await producer
+    finally:
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI-обработчик, перебирающий потоковые ответы вне цикла событий.
+
+    Django 3.2 перебирает потоковый ответ прямо в цикле событий: чтение
+    файла блокирует цикл, а генераторы, обращающиеся к БД, падают.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        parts = iterate_in_pool(response)
+        try:
+            async for part in parts:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+        finally:
+            await parts.aclose()
+        await send({'type': 'http.response.body'})
+        await run_sync(response.close)
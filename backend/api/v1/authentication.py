@@ -0,0 +1,216 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from recipes.generations import bump_generation, get_generations
+
+User = get_user_model()
+CACHE_KEY_PREFIX = 'auth-token'
+SIGNED_TOKEN_SALT = 'api.v1.authentication'
+USER_FIELDS = (
+    'id',
+    'email',
+    'username',
+    'first_name',
+    'last_name',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+)
+REVOKING_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser')
+INVALID_TOKEN = 'Недействительный токен.'
+INACTIVE_USER = 'Пользователь неактивен или удалён.'
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш записей с ограниченным сроком жизни."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = TTLCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_TTL
+)
+
+
+def auth_generation(user_id):
+    """Поколение, меняющееся при выходе, смене пароля или прав, блокировке."""
+
+    return f'auth:{user_id}'
+
+
+def profile_generation(user_id):
+    """Поколение, меняющееся при любом изменении пользователя."""
+
+    return f'profile:{user_id}'
+
+
+def get_user_generations(user_id):
+    return get_generations(
+        auth_generation(user_id), profile_generation(user_id)
+    )
+
+
+def build_user(values):
+    """Новый экземпляр пользователя из закэшированных полей.
+
+    Остальные поля, в том числе счётчики и пароль, отложены и при
+    обращении читаются из БД, а сохранение затрагивает только загруженные.
+    """
+
+    fields = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in values
+    ]
+    return User.from_db('default', fields, [values[field] for field in fields])
+
+
+def sign_token(user):
+    """Подписанный токен, проверяемый без обращения к БД.
+
+    Токен отзывается вместе с обычным токеном пользователя, при смене
+    пароля или прав администратора и при блокировке.
+    """
+
+    payload = {field: getattr(user, field) for field in USER_FIELDS}
+    payload['generation'] = get_generations(auth_generation(user.id))[0]
+    return signing.dumps(payload, salt=SIGNED_TOKEN_SALT, compress=True)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя.
+
+    Поля пользователя по токену ищутся в LRU-кэше процесса, затем в общем
+    кэше и только потом в БД. Каждый запрос получает свой экземпляр
+    пользователя, счётчики которого читаются из БД при обращении. Запись
+    в кэше действительна, пока не сменились поколения пользователя, поэтому
+    при общем кэше выход, смена пароля и блокировка действуют во всех
+    процессах сразу. При AUTH_SIGNED_TOKENS принимаются также подписанные
+    токены, для которых БД не нужна вовсе.
+    """
+
+    def authenticate_credentials(self, key):
+        if settings.AUTH_SIGNED_TOKENS and ':' in key:
+            user = self.authenticate_signed(key)
+        else:
+            user = self.authenticate_cached(key)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(INACTIVE_USER)
+        return user, Token(key=key, user=user)
+
+    def authenticate_cached(self, key):
+        cache_key = (
+            f'{CACHE_KEY_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}'
+        )
+        entry = local_cache.get(cache_key)
+        is_local = entry is not None
+        if not is_local:
+            entry = cache.get(cache_key)
+        if entry is not None:
+            values, generations = entry
+            if generations == get_user_generations(values['id']):
+                if not is_local:
+                    local_cache.set(cache_key, entry)
+                return build_user(values)
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            local_cache.delete(cache_key)
+            cache.delete(cache_key)
+            raise exceptions.AuthenticationFailed(INVALID_TOKEN)
+        user = token.user
+        entry = (
+            {field: getattr(user, field) for field in USER_FIELDS},
+            get_user_generations(user.id),
+        )
+        local_cache.set(cache_key, entry)
+        cache.set(cache_key, entry, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return user
+
+    def authenticate_signed(self, key):
+        try:
+            payload = signing.loads(
+                key,
+                salt=SIGNED_TOKEN_SALT,
+                max_age=settings.AUTH_SIGNED_TOKEN_MAX_AGE,
+            )
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed(INVALID_TOKEN)
+        generation = payload.pop('generation', None)
+        if generation != get_generations(auth_generation(payload['id']))[0]:
+            raise exceptions.AuthenticationFailed(INVALID_TOKEN)
+        return build_user(payload)
+
+
+@receiver(pre_save, sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+            update_fields and set(update_fields) <= {'last_login'}):
+        return
+    names = [profile_generation(instance.pk)]
+    previous = sender.objects.filter(pk=instance.pk).values(
+        *REVOKING_FIELDS
+    ).first()
+    if previous and any(
+            previous[field] != getattr(instance, field)
+            for field in REVOKING_FIELDS):
+        names.append(auth_generation(instance.pk))
+    transaction.on_commit(lambda: bump_generation(*names))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: bump_generation(
+        auth_generation(user_id), profile_generation(user_id)
+    ))
+
+
+@receiver(post_delete, sender=Token)
+def revoke_user_tokens(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: bump_generation(auth_generation(instance.user_id))
+    )
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from rest_framework import serializers
+
+from jobs.queue import enqueue
+from recipes.counters import change_counter
+from recipes.generations import bump_generation
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.tasks import fan_out_recipes, generate_image_derivatives
+
+from .serializers import RecipeWriteSerializer
+
+User = get_user_model()
+NOT_AN_OBJECT = 'Ожидается объект рецепта.'
+ID_FIELD = serializers.IntegerField()
+
+
+def to_id(value):
+    """Id так же, как его примет сериализатор рецепта, иначе None."""
+
+    try:
+        return ID_FIELD.to_internal_value(value)
+    except serializers.ValidationError:
+        return None
+
+
+def load_catalogue(items):
+    """Существующие id тэгов и ингредиентов из всех рецептов пачки."""
+
+    tag_ids, ingredient_ids = set(), set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        tags, ingredients = item.get('tags'), item.get('ingredients')
+        if isinstance(tags, list):
+            tag_ids.update(to_id(tag) for tag in tags)
+        if isinstance(ingredients, list):
+            ingredient_ids.update(
+                to_id(ingredient.get('id'))
+                for ingredient in ingredients
+                if isinstance(ingredient, dict)
+            )
+    tag_ids.discard(None)
+    ingredient_ids.discard(None)
+    return {
+        Tag: set(
+            Tag.objects.filter(id__in=tag_ids).values_list('id', flat=True)
+        ),
+        Ingredient: set(
+            Ingredient.objects.filter(
+                id__in=ingredient_ids
+            ).values_list('id', flat=True)
+        ),
+    }
+
+
+def prepare_recipe(item, author, context):
+    """Проверяет рецепт и сохраняет его изображение в хранилище.
+
+    Выполняется в пуле потоков, к БД не обращается.
+    """
+
+    try:
+        if not isinstance(item, dict):
+            return None, {'non_field_errors': [NOT_AN_OBJECT]}
+        serializer = RecipeWriteSerializer(data=item, context=context)
+        if not serializer.is_valid():
+            return None, serializer.errors
+        data = dict(serializer.validated_data)
+        tags, amounts, image = (
+            data.pop('tags'), data.pop('ingredients'), data.pop('image')
+        )
+        recipe = Recipe(author=author, merged_on_read=True, **data)
+        recipe.image.save(image.name, image, save=False)
+        return (recipe, tags, amounts), None
+    finally:
+        connections.close_all()
+
+
+def insert_recipes(prepared):
+    """Вставляет проверенные рецепты пачкой в одной транзакции."""
+
+    recipes = [recipe for recipe, _, _ in prepared]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+    else:
+        for recipe in recipes:
+            recipe.save()
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+        for recipe, tags, _ in prepared
+        for tag_id in tags
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe_id=recipe.id, ingredient_id=ingredient_id, amount=amount
+        )
+        for recipe, _, amounts in prepared
+        for ingredient_id, amount in amounts.items()
+    )
+    return recipes
+
+
+def import_recipes(items, request):
+    """Импорт пачки рецептов с отчётом об ошибках по каждому элементу.
+
+    Рецепты проверяются и их изображения сохраняются параллельно, затем
+    все корректные рецепты вставляются одной транзакцией.
+    """
+
+    author = request.user
+    context = {'request': request, 'catalogue': load_catalogue(items)}
+    with ThreadPoolExecutor(
+        max_workers=settings.RECIPE_BULK_WORKERS
+    ) as executor:
+        results = list(executor.map(
+            lambda item: prepare_recipe(item, author, context), items
+        ))
+    prepared = [result for result, _ in results if result is not None]
+    errors = [
+        {'index': index, 'errors': item_errors}
+        for index, (_, item_errors) in enumerate(results) if item_errors
+    ]
+    if not prepared:
+        return [], errors
+    with transaction.atomic():
+        recipes = insert_recipes(prepared)
+        change_counter(User, author.id, 'recipes_count', len(recipes))
+        author.refresh_from_db(fields=['followers_count'])
+        transaction.on_commit(lambda: bump_generation('recipes'))
+        enqueue(
+            generate_image_derivatives, [recipe.id for recipe in recipes]
+        )
+        enqueue(
+            fan_out_recipes,
+            [recipe.id for recipe in recipes],
+            author.id,
+            author.followers_count,
+        )
+    return recipes, errors
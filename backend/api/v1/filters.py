@@ -1,18 +1,8 @@
 import django_filters as filters
-from rest_framework.filters import SearchFilter
 
 from users.models import User
-from recipes.models import Recipe, Ingredient, Tag
-
-
-class IngredientsFilter(SearchFilter):
-    """Фильтр ингредиентов."""
-
-    search_param = 'name'
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
@@ -21,12 +11,17 @@ class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_in_shopping_cart = filters.BooleanFilter(
         widget=filters.widgets.BooleanWidget(),
+        method='filter_by_user',
+        field_name='shopping_cart__user',
         label='В корзине.'
     )
     is_favorited = filters.BooleanFilter(
         widget=filters.widgets.BooleanWidget(),
+        method='filter_by_user',
+        field_name='favorite_recipe__user',
         label='В избранных.'
     )
+    search = filters.CharFilter(method='filter_search', label='Поиск')
     tags = filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name='tags__slug',
@@ -36,4 +31,17 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ['is_favorited', 'is_in_shopping_cart', 'author', 'tags']
+        fields = [
+            'is_favorited', 'is_in_shopping_cart', 'author', 'tags', 'search'
+        ]
+
+    def filter_by_user(self, queryset, name, value):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        if value:
+            return queryset.filter(**{name: user})
+        return queryset.exclude(**{name: user})
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
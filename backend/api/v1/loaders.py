@@ -0,0 +1,67 @@
+from recipes.models import FavoriteRecipe, ShoppingCart, Subscribe
+
+FLAGS = {
+    'is_subscribed': (Subscribe, 'user', 'author_id'),
+    'is_favorited': (
+        FavoriteRecipe.recipe.through, 'favoriterecipe__user', 'recipe_id'
+    ),
+    'is_in_shopping_cart': (
+        ShoppingCart.recipe.through, 'shoppingcart__user', 'recipe_id'
+    ),
+}
+
+
+class ViewerFlagsLoader:
+    """Загрузчик флагов подписки, избранного и корзины для текущего запроса.
+
+    Сериализаторы списков заранее сообщают id авторов и рецептов, и при
+    первом обращении к флагу все они загружаются одним IN-запросом.
+    Результаты запоминаются до конца запроса.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.pending = {flag: set() for flag in FLAGS}
+        self.values = {flag: {} for flag in FLAGS}
+
+    def prime(self, flag, ids):
+        self.pending[flag].update(
+            pk for pk in ids if pk not in self.values[flag]
+        )
+
+    def get(self, flag, pk):
+        if self.user is None or not self.user.is_authenticated:
+            return False
+        values = self.values[flag]
+        if pk not in values:
+            ids = self.pending[flag] | {pk}
+            self.pending[flag] = set()
+            found = set(self.load(flag, ids))
+            values.update((object_id, object_id in found) for object_id in ids)
+        return values[pk]
+
+    def load(self, flag, ids):
+        model, user_lookup, id_field = FLAGS[flag]
+        return model.objects.filter(
+            **{user_lookup: self.user, f'{id_field}__in': ids}
+        ).values_list(id_field, flat=True)
+
+    def is_subscribed(self, author_id):
+        return self.get('is_subscribed', author_id)
+
+    def is_favorited(self, recipe_id):
+        return self.get('is_favorited', recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return self.get('is_in_shopping_cart', recipe_id)
+
+
+def get_loader(context):
+    """Загрузчик флагов, общий для всех сериализаторов одного запроса."""
+
+    request = context.get('request')
+    if request is None:
+        return ViewerFlagsLoader(None)
+    if not hasattr(request, 'viewer_flags'):
+        request.viewer_flags = ViewerFlagsLoader(request.user)
+    return request.viewer_flags
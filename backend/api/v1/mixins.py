@@ -1,10 +1,40 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 
+from recipes.generations import get_generations, user_generation
 from recipes.models import Recipe
 
+from .pagination import KeysetPagination
 from .serializers import SubscribeRecipeSerializer
 
+CURSOR_PAGINATION = 'cursor'
+
+
+def request_digest(request, *extra):
+    """Хэш запроса с нормализованным порядком параметров."""
+
+    params = sorted(
+        (key, sorted(request.query_params.getlist(key)))
+        for key in request.query_params
+    )
+    raw = json.dumps([
+        request.get_host(),
+        request.path,
+        request.accepted_renderer.format,
+        params,
+        *extra,
+    ])
+    return hashlib.md5(raw.encode()).hexdigest()
+
 
 class GetObjectMixin:
     """Миксина для добавления и удаления понравившихся рецептов в корзине."""
@@ -17,3 +47,133 @@ class GetObjectMixin:
         recipe = get_object_or_404(Recipe, id=recipe_id)
         self.check_object_permissions(self.request, recipe)
         return recipe
+
+
+class CursorPaginationMixin:
+    """Миксина для включения пагинации по курсору параметром запроса."""
+
+    cursor_pagination_class = KeysetPagination
+    pagination_query_param = 'pagination'
+
+    def get_cursor_pagination_class(self):
+        return self.cursor_pagination_class
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.request.query_params.get(
+                self.pagination_query_param) == CURSOR_PAGINATION:
+            pagination_class = self.get_cursor_pagination_class()
+            if pagination_class is not None:
+                self._paginator = pagination_class()
+        return super().paginator
+
+
+class AnonymousCacheMixin:
+    """Миксина для общего кэша ответов на чтение анонимным пользователям.
+
+    Запись считается свежей, пока не сменилось поколение данных из
+    cache_generations и не истёк RESPONSE_CACHE_TIMEOUT. Устаревшую
+    запись отдаёт любой воркер, пока один из них обновляет её под
+    блокировкой, поэтому после изменения данных нет лавины запросов к БД.
+    """
+
+    cache_generations = ()
+    cache_alias = 'responses'
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_response_cache_key(self, request):
+        return f'response:{request_digest(request)}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated or not self.cache_generations:
+            return handler(request, *args, **kwargs)
+        cache = caches[self.cache_alias]
+        key = self.get_response_cache_key(request)
+        generations = get_generations(*self.cache_generations)
+        entry = cache.get(key)
+        if entry is not None:
+            fresh = (
+                entry['generations'] == generations
+                and entry['expires'] > time.time()
+            )
+            if fresh or not cache.add(
+                    f'{key}:lock', 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+                return Response(entry['data'], status=entry['status'])
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, {
+                    'generations': generations,
+                    'expires': time.time()
+                    + settings.RESPONSE_CACHE_TIMEOUT,
+                    'data': response.data,
+                    'status': response.status_code,
+                })
+        finally:
+            if entry is not None:
+                cache.delete(f'{key}:lock')
+        return response
+
+
+class ConditionalGetMixin:
+    """Миксина для ответов 304 по ETag и Last-Modified.
+
+    ETag строится из поколений данных cache_generations и личного
+    поколения пользователя, поэтому проверяется без запросов к БД.
+    Last-Modified отдаётся, если вью умеет дешёво получить дату изменения.
+    """
+
+    cache_generations = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_etag(self, request):
+        names = self.cache_generations
+        if request.user.is_authenticated:
+            names += (user_generation(request.user.id),)
+        return quote_etag(request_digest(request, get_generations(*names)))
+
+    def get_last_modified(self, request):
+        return None
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if not self.cache_generations:
+            return handler(request, *args, **kwargs)
+        etag = self.get_etag(request)
+        last_modified = None
+        if 'HTTP_IF_NONE_MATCH' not in request.META and (
+                'HTTP_IF_MODIFIED_SINCE' in request.META):
+            last_modified = self.get_last_modified(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if last_modified is None:
+                last_modified = self.get_last_modified(request)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = (
+            'private, no-cache' if request.user.is_authenticated
+            else 'no-cache'
+        )
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -1,8 +1,281 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+from binascii import Error as DecodeError
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.generations import get_generations
+
+INVALID_CURSOR = 'Некорректный курсор.'
+NO_COUNT_VALUES = ('0', 'false', 'none')
+IGNORED_COUNT_PARAMS = (
+    'page',
+    'limit',
+    'count',
+    'pagination',
+    'cursor',
+    'fields',
+    'expand',
+    'format',
+    'recipes_limit',
+)
+
+
+class CountStrategyPaginator(Paginator):
+    """Пагинатор, получающий общее число объектов от стратегии подсчёта."""
+
+    def __init__(self, *args, count_function, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_function = count_function
+
+    @cached_property
+    def count(self):
+        return self.count_function(self.object_list)
 
 
 class LimitPagination(PageNumberPagination):
-    """Основной пагинатор для проекта."""
+    """Основной пагинатор для проекта.
+
+    Общее число объектов кэшируется по нормализованным параметрам
+    фильтрации до смены поколения данных, заявленного атрибутом вью
+    count_generations. Для списков без фильтров в PostgreSQL берётся
+    оценка из статистики таблицы, а с параметром count=false подсчёт
+    не выполняется вовсе и в ответе остаётся только has_next.
+    """
 
     page_size = 6
     page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    @property
+    def django_paginator_class(self):
+        return partial(CountStrategyPaginator, count_function=self.get_count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        self.without_count = request.query_params.get(
+            self.count_query_param, ''
+        ).lower() in NO_COUNT_VALUES
+        if self.without_count:
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            self.number = int(request.query_params.get(
+                self.page_query_param, 1
+            ))
+        except ValueError:
+            self.number = 0
+        if self.number < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=self.number, message='')
+            )
+        offset = (self.number - 1) * page_size
+        page = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(page) > page_size
+        return page[:page_size]
+
+    def get_count(self, queryset):
+        estimate = self.get_estimate(queryset)
+        if estimate is not None:
+            return estimate
+        generations = getattr(self.view, 'count_generations', ())
+        params = self.request.query_params
+        uncached = getattr(self.view, 'uncached_count_params', ())
+        if not generations or any(param in params for param in uncached):
+            return queryset.count()
+        normalized = sorted(
+            (key, sorted(params.getlist(key)))
+            for key in params if key not in IGNORED_COUNT_PARAMS
+        )
+        key = 'count:{}:{}:{}'.format(
+            queryset.model._meta.label_lower,
+            ':'.join(map(str, get_generations(*generations))),
+            hashlib.md5(json.dumps(normalized).encode()).hexdigest(),
+        )
+        return cache.get_or_set(
+            key, queryset.count, settings.COUNT_CACHE_TIMEOUT
+        )
+
+    def get_estimate(self, queryset):
+        """Оценка числа строк из статистики для списков без фильтров."""
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                (queryset.model._meta.db_table,),
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.COUNT_ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+    def get_next_link(self):
+        if not self.without_count:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.page_query_param,
+            self.number + 1,
+        )
+
+    def get_previous_link(self):
+        if not self.without_count:
+            return super().get_previous_link()
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.page_query_param, self.number - 1
+        )
+
+    def get_paginated_response(self, data):
+        if not self.without_count:
+            return super().get_paginated_response(data)
+        return Response({
+            'has_next': self.has_next,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу сортировки без COUNT и OFFSET.
+
+    Курсор хранит значения полей ordering последнего (или первого, для
+    предыдущей страницы) объекта, поэтому глубина прокрутки не влияет
+    на скорость запроса.
+    """
+
+    page_size = 6
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        ordering = [
+            self.invert(field) if reverse else field
+            for field in self.ordering
+        ]
+        if position is not None:
+            queryset = queryset.filter(self.get_filter(position, reverse))
+        page = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(page) > page_size
+        self.page = page[:page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def invert(self, field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def get_filter(self, position, reverse):
+        """Условие «строго после позиции» для составного ключа."""
+
+        condition, equal = Q(), {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, instance):
+        return [
+            self.model._meta.get_field(field.lstrip('-')).value_to_string(
+                instance
+            )
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, instance, reverse):
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            {'p': self.get_position(instance), 'r': reverse}
+        ).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = data['p'], bool(data['r'])
+            position = [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (DecodeError, ValidationError, ValueError, TypeError,
+                KeyError):
+            raise NotFound(INVALID_CURSOR)
+        if len(values) != len(self.ordering) or None in position:
+            raise NotFound(INVALID_CURSOR)
+        return position, reverse
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class SubscriptionsKeysetPagination(KeysetPagination):
+    """Пагинация подписок по дате подписки."""
+
+    ordering = ('-created', '-id')
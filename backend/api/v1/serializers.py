@@ -1,16 +1,54 @@
+import inspect
+
 import django.contrib.auth.password_validation as validators
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Manager
 from drf_base64.fields import Base64ImageField
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Subscribe, Tag
+from jobs.models import Job
+from jobs.queue import enqueue
+from jobs.registry import JOBS
+from PIL import Image
+from recipes.images import UPLOAD_FORMATS, read_image_header
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem, Subscribe, Tag)
+from recipes.tasks import generate_image_derivatives
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
+from .loaders import get_loader
+
 User = get_user_model()
 AUTH_ERROR = 'Не удается войти в систему с предоставленными учетными данными.'
 
 
+def check_image(image):
+    """Проверяет размер файла, формат и число пикселей по заголовку."""
+
+    if image.size > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise serializers.ValidationError(
+            f'Файл больше {settings.RECIPE_IMAGE_MAX_SIZE} байт.'
+        )
+    too_large = serializers.ValidationError(
+        f'Изображение больше {settings.RECIPE_IMAGE_MAX_PIXELS} пикселей.'
+    )
+    try:
+        image_format, (width, height) = read_image_header(image)
+    except Image.DecompressionBombError:
+        raise too_large
+    except OSError:
+        raise serializers.ValidationError('Файл не является изображением.')
+    if image_format not in UPLOAD_FORMATS:
+        raise serializers.ValidationError(
+            f'Допустимые форматы: {", ".join(UPLOAD_FORMATS)}.'
+        )
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise too_large
+    return image
+
+
 class TokenSerializer(serializers.Serializer):
     email = serializers.CharField(
         label='Email',
@@ -47,22 +85,29 @@ class TokenSerializer(serializers.Serializer):
         return attrs
 
 
+class FlagsListSerializer(serializers.ListSerializer):
+    """Сообщает загрузчику флагов id всех объектов страницы."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        self.child.prime_flags(get_loader(self.context), items)
+        return super().to_representation(items)
+
+
 class GetIsSubscribedMixin:
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return user.follower.filter(author=obj).exists()
+        return get_loader(self.context).is_subscribed(obj.id)
 
 
 class UserListSerializer(
         GetIsSubscribedMixin,
         serializers.ModelSerializer):
-    is_subscribed = serializers.BooleanField(read_only=True)
+    is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
+        list_serializer_class = FlagsListSerializer
         fields = (
             'email',
             'id',
@@ -70,8 +115,13 @@ class UserListSerializer(
             'first_name',
             'last_name',
             'is_subscribed',
+            'recipes_count',
+            'followers_count',
         )
 
+    def prime_flags(self, loader, users):
+        loader.prime('is_subscribed', [user.id for user in users])
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
 
@@ -122,7 +172,7 @@ class UserPasswordSerializer(serializers.Serializer):
             validated_data.get('new_password')
         )
         user.password = password
-        user.save()
+        user.save(update_fields=['password'])
         return validated_data
 
 
@@ -174,6 +224,8 @@ class RecipeUserSerializer(
             'first_name',
             'last_name',
             'is_subscribed',
+            'recipes_count',
+            'followers_count',
         )
 
 
@@ -189,10 +241,7 @@ class IngredientsEditSerializer(serializers.ModelSerializer):
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     image = Base64ImageField(max_length=None, use_url=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientsEditSerializer(many=True)
 
     class Meta:
@@ -200,18 +249,31 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('author',)
 
-    def validate(self, data):
-        tags = data['tags']
+    def get_existing_ids(self, model, ids):
+        """Существующие id, при пакетном импорте из загруженного каталога."""
+
+        catalogue = self.context.get('catalogue')
+        if catalogue is not None:
+            return catalogue[model] & ids
+        return set(
+            model.objects.filter(id__in=ids).values_list('id', flat=True)
+        )
+
+    def validate_image(self, image):
+        return check_image(image)
+
+    def validate_tags(self, tags):
         if not tags:
             raise serializers.ValidationError(
                 'Нужен хотя бы один тэг.'
             )
-        for tag_name in tags:
-            if not Tag.objects.filter(name=tag_name).exists():
-                raise serializers.ValidationError(
-                    f'Тэг {tag_name} отсутствует.'
-                )
-        return data
+        tags = set(tags)
+        missing = tags - self.get_existing_ids(Tag, tags)
+        if missing:
+            raise serializers.ValidationError(
+                f'Тэги {sorted(missing)} отсутствуют.'
+            )
+        return tags
 
     def validate_cooking_time(self, cooking_time):
         if int(cooking_time) < 1:
@@ -230,51 +292,128 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Количество ингредиента должно быть больше 1.'
                 )
-        ingredient_list = []
-        for items in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=items['id']
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        if len(amounts) != len(ingredients):
+            raise serializers.ValidationError(
+                'Укажите уникальный ингридиент.'
             )
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    'Укажите уникальный ингридиент.'
-                )
-            ingredient_list.append(ingredient)
-        return ingredients
-
-    def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount'),
+        missing = amounts.keys() - self.get_existing_ids(
+            Ingredient, set(amounts)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты {sorted(missing)} отсутствуют.'
             )
+        return amounts
 
     def create(self, validated_data):
-        ingredients = validated_data.pop('ingredients')
+        amounts = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients(ingredients, recipe)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                for ingredient_id, amount in amounts.items()
+            )
+            enqueue(generate_image_derivatives, [recipe.id])
         return recipe
 
+    def update_ingredients(self, instance, amounts):
+        """Изменяет только добавленные, удалённые и изменённые ингредиенты.
+
+        Разница количеств сразу применяется к спискам покупок.
+        """
+
+        current = {
+            item.ingredient_id: item for item in instance.foreign_recipes.all()
+        }
+        RecipeIngredient.objects.filter(id__in=[
+            item.id for ingredient_id, item in current.items()
+            if ingredient_id not in amounts
+        ]).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+        deltas = dict(amounts)
+        changed = []
+        for ingredient_id, item in current.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - item.amount
+            if ingredient_id in amounts and deltas[ingredient_id]:
+                item.amount = amounts[ingredient_id]
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if any(deltas.values()):
+            ShoppingListItem.objects.apply_delta(
+                instance.shopping_cart.values_list('user_id', flat=True),
+                deltas,
+            )
+
     def update(self, instance, validated_data):
-        if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
-        if 'tags' in validated_data:
-            instance.tags.set(validated_data.pop('tags'))
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            if 'ingredients' in validated_data:
+                self.update_ingredients(
+                    instance, validated_data.pop('ingredients')
+                )
+            if 'tags' in validated_data:
+                instance.tags.set(validated_data.pop('tags'))
+            if 'image' in validated_data:
+                validated_data['image_derivatives'] = {}
+                enqueue(generate_image_derivatives, [instance.id])
+            return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         return RecipeReadSerializer(
-            instance,
+            Recipe.recipes_related.get(pk=instance.pk),
             context={'request': self.context.get('request')}
         ).data
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """Миксина, оставляющая в ответе только запрошенные поля."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """Загрузка фото рецепта файлом, без base64.
+
+    Файл сохраняется во временный файл на диске, изображение проверяется
+    только по заголовку.
+    """
+
+    image = serializers.FileField(validators=(check_image,))
+
+    class Meta:
+        model = Recipe
+        fields = ('image',)
+
+    def update(self, instance, validated_data):
+        validated_data['image_derivatives'] = {}
+        with transaction.atomic():
+            recipe = super().update(instance, validated_data)
+            enqueue(generate_image_derivatives, [recipe.id])
+        return recipe
+
+    def to_representation(self, instance):
+        return RecipeReadSerializer(
+            Recipe.recipes_related.get(pk=instance.pk),
+            context={'request': self.context.get('request')}
+        ).data
+
+
+class RecipeReadSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = RecipeUserSerializer(
         read_only=True,
@@ -285,12 +424,74 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         required=True,
         source='foreign_recipes',
     )
-    is_favorited = serializers.BooleanField(read_only=True)
-    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    image_derivatives = serializers.SerializerMethodField()
+    list_fields = (
+        'id',
+        'tags',
+        'author',
+        'is_favorited',
+        'is_in_shopping_cart',
+        'name',
+        'image',
+        'image_derivatives',
+        'cooking_time',
+    )
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        fields = (
+            'id',
+            'tags',
+            'author',
+            'ingredients',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'image',
+            'image_derivatives',
+            'text',
+            'cooking_time',
+            'pub_date',
+            'favorites_count',
+            'in_carts_count',
+        )
+        list_serializer_class = FlagsListSerializer
+
+    def prime_flags(self, loader, recipes):
+        recipe_ids = [recipe.id for recipe in recipes]
+        for flag in ('is_favorited', 'is_in_shopping_cart'):
+            if flag in self.fields:
+                loader.prime(flag, recipe_ids)
+        if 'author' in self.fields:
+            loader.prime(
+                'is_subscribed', [recipe.author_id for recipe in recipes]
+            )
+
+    def get_is_favorited(self, obj):
+        return get_loader(self.context).is_favorited(obj.id)
+
+    def get_is_in_shopping_cart(self, obj):
+        return get_loader(self.context).is_in_shopping_cart(obj.id)
+
+    def get_image_derivatives(self, obj):
+        """Ссылки на уменьшенные копии фото или None, пока они готовятся."""
+
+        if not obj.image_derivatives:
+            return None
+        request = self.context.get('request')
+        storage = obj.image.storage
+        return {
+            size: {
+                image_format: (
+                    request.build_absolute_uri(storage.url(name)) if request
+                    else storage.url(name)
+                )
+                for image_format, name in formats.items()
+            }
+            for size, formats in obj.image_derivatives.items()
+        }
 
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
@@ -300,6 +501,26 @@ class SubscribeRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return max(limit, 0)
+
+
+class SubscribeListSerializer(FlagsListSerializer):
+    """Загружает рецепты всех авторов страницы одним запросом."""
+
+    def to_representation(self, data):
+        subscriptions = list(data)
+        self.recipes_by_author = Recipe.recipes_related.latest_by_authors(
+            {subscription.author_id for subscription in subscriptions},
+            get_recipes_limit(self.context['request']),
+        )
+        return super().to_representation(subscriptions)
+
+
 class SubscribeSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='author.id')
     email = serializers.EmailField(source='author.email')
@@ -307,8 +528,11 @@ class SubscribeSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(source='author.first_name')
     last_name = serializers.CharField(source='author.last_name')
     recipes = serializers.SerializerMethodField()
-    is_subscribed = serializers.BooleanField(read_only=True)
-    recipes_count = serializers.IntegerField(read_only=True)
+    is_subscribed = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(source='author.recipes_count')
+    followers_count = serializers.IntegerField(
+        source='author.followers_count'
+    )
 
     class Meta:
         model = Subscribe
@@ -321,13 +545,67 @@ class SubscribeSerializer(serializers.ModelSerializer):
             'is_subscribed',
             'recipes',
             'recipes_count',
+            'followers_count',
         )
+        list_serializer_class = SubscribeListSerializer
+
+    def prime_flags(self, loader, subscriptions):
+        loader.prime('is_subscribed', [
+            subscription.author_id for subscription in subscriptions
+        ])
+
+    def get_is_subscribed(self, obj):
+        return get_loader(self.context).is_subscribed(obj.author_id)
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = (
-            obj.author.foreign_recipes.all()[:int(limit)] if limit
-            else obj.author.foreign_recipes.all()
+        recipes_by_author = getattr(self.parent, 'recipes_by_author', None)
+        if recipes_by_author is None:
+            recipes_by_author = Recipe.recipes_related.latest_by_authors(
+                [obj.author_id], get_recipes_limit(self.context['request'])
+            )
+        return SubscribeRecipeSerializer(
+            recipes_by_author[obj.author_id], many=True
+        ).data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Постановка публичной фоновой задачи в очередь и её статус."""
+
+    params = serializers.DictField(write_only=True, default=dict)
+
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'name',
+            'params',
+            'status',
+            'attempts',
+            'created_at',
+            'finished_at',
+        )
+        read_only_fields = ('status', 'attempts', 'created_at', 'finished_at')
+
+    def validate_name(self, name):
+        if name not in JOBS or not JOBS[name].public:
+            raise serializers.ValidationError(f'Задача {name} не найдена.')
+        return name
+
+    def validate(self, data):
+        user = self.context['request'].user
+        try:
+            inspect.signature(JOBS[data['name']]).bind(
+                user_id=user.id, **data['params']
+            )
+        except TypeError as error:
+            raise serializers.ValidationError({'params': str(error)})
+        return data
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        return enqueue(
+            validated_data['name'],
+            user=user,
+            user_id=user.id,
+            **validated_data['params'],
         )
-        return SubscribeRecipeSerializer(recipes, many=True).data
@@ -0,0 +1,40 @@
+import tempfile
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.base import ContentFile
+
+from jobs.queue import result_storage
+from jobs.registry import JobError, job
+
+from .utils import (FILENAME_BASE, SHOPPING_LIST_FORMATS, SPOOL_SIZE,
+                    get_shopping_list, pdf_create)
+
+User = get_user_model()
+
+
+@job(public=True)
+def render_shopping_list(user_id, export_format='pdf'):
+    """Готовит файл списка покупок для скачивания по результату задачи."""
+
+    if export_format != 'pdf' and export_format not in SHOPPING_LIST_FORMATS:
+        raise JobError(f'Формат {export_format} не поддерживается.')
+    shopping_list = get_shopping_list(User.objects.get(id=user_id))
+    name = f'{uuid.uuid4().hex}.{export_format}'
+    if export_format == 'pdf':
+        content_type = 'application/pdf'
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as buffer:
+            name = result_storage.save(
+                name, File(pdf_create(shopping_list.iterator(), buffer))
+            )
+    else:
+        content_type, writer = SHOPPING_LIST_FORMATS[export_format]
+        name = result_storage.save(name, ContentFile(
+            ''.join(writer(shopping_list.iterator())).encode()
+        ))
+    return {
+        'file': name,
+        'filename': f'{FILENAME_BASE}.{export_format}',
+        'content_type': content_type,
+    }
@@ -1,12 +1,14 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import offload_patterns
 from .views import (
     AddAndDeleteSubscribe,
     AddDeleteFavoriteRecipe,
     AddDeleteShoppingCart,
     AuthToken,
     IngredientsViewSet,
+    JobsViewSet,
     RecipesViewSet,
     TagsViewSet,
     UsersViewSet,
@@ -20,9 +22,10 @@ router.register('users', UsersViewSet)
 router.register('tags', TagsViewSet)
 router.register('ingredients', IngredientsViewSet)
 router.register('recipes', RecipesViewSet)
+router.register('jobs', JobsViewSet, basename='job')
 
 
-urlpatterns = [
+urlpatterns = offload_patterns([
     path(
         'auth/token/login/',
         AuthToken.as_view(),
@@ -48,7 +51,7 @@ urlpatterns = [
         AddDeleteShoppingCart.as_view(),
         name='shopping_cart'
     ),
-    path('', include(router.urls)),
+    path('', include(offload_patterns(router.urls))),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
-]
+])
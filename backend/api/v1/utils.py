@@ -1,46 +1,206 @@
+import csv
+import hashlib
 import io
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 
 from django.conf import settings
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from django.db.models import F, Sum
 
 INDENT = 18
 X_LIMITER, Y_LIMITER = 50, 800
 LIST_SIZE = 14
 EMPTY_LIST_SIZE = 18
+SPOOL_SIZE = 1024 * 1024
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+EMPTY_LIST = 'Список покупок пуст.'
+FILENAME_BASE = 'shoppingcart'
 
 
-def pdf_create(data):
+class LRUCache:
+    """Потокобезопасный LRU-кэш, ограниченный числом записей и их объёмом."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self.size -= len(self._data.pop(key))
+            self._data[key] = value
+            self.size += len(value)
+            while (
+                len(self._data) > self.max_entries
+                or self.size > self.max_bytes
+            ):
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+pdf_cache = LRUCache(
+    settings.SHOPPING_LIST_PDF_CACHE_SIZE,
+    settings.SHOPPING_LIST_PDF_CACHE_BYTES,
+)
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт один раз на процесс."""
+
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    pdfmetrics.registerFont(TTFont('Font', settings.FONT_PATH))
+
+
+def get_shopping_list(user):
+    """Строки списка покупок пользователя, отсортированные по названию."""
+
+    return user.shopping_list.values(
+        ingredients__name=F('ingredient__name'),
+        ingredients__measurement_unit=F('ingredient__measurement_unit'),
+    ).annotate(amount=Sum('amount')).order_by('ingredients__name')
+
+
+def shopping_list_digest(data):
+    """Хэш содержимого списка покупок."""
+
+    digest = hashlib.sha256()
+    for item in data:
+        digest.update(json.dumps(
+            (
+                item['ingredients__name'],
+                item['ingredients__measurement_unit'],
+                item['amount'],
+            ),
+            ensure_ascii=False,
+        ).encode())
+    return digest.hexdigest()
+
+
+def get_shopping_list_pdf(data, digest):
+    """Возвращает pdf-файл списка покупок из кэша или создаёт новый."""
+
+    content = pdf_cache.get(digest)
+    if content is not None:
+        return io.BytesIO(content)
+    buffer = pdf_create(
+        data, tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    )
+    if buffer.seek(0, io.SEEK_END) <= pdf_cache.max_bytes:
+        buffer.seek(0)
+        pdf_cache.set(digest, buffer.read())
+    buffer.seek(0)
+    return buffer
+
+
+def pdf_create(data, buffer=None):
     """Функция для генерации pdf-файла из переданного в неё списка."""
 
-    buffer = io.BytesIO()
+    from reportlab.pdfgen import canvas
+
+    if buffer is None:
+        buffer = io.BytesIO()
     page = canvas.Canvas(buffer)
-    pdfmetrics.registerFont(TTFont('Font', settings.FONT_PATH))
+    register_font()
     cursor_x, cursor_y = X_LIMITER, Y_LIMITER
     page.setFont('Font', LIST_SIZE)
-    if data:
-        page.drawString(cursor_x, cursor_y, 'Cписок покупок:')
-        for index, recipe in enumerate(data, start=1):
-            page.drawString(
-                cursor_x, cursor_y - INDENT,
-                f'{index}. {recipe["ingredients__name"]} - '
-                f'{recipe["amount"]} '
-                f'{recipe["ingredients__measurement_unit"]}.'
-            )
-            cursor_y -= INDENT
-            if cursor_y <= X_LIMITER:
-                page.showPage()
-                cursor_y = Y_LIMITER
-        page.save()
-        buffer.seek(0)
-        return buffer
-    page.setFont('Font', EMPTY_LIST_SIZE)
-    page.drawString(
-        cursor_x,
-        cursor_y,
-        'Список покупок пуст.',
-    )
+    index = 0
+    for index, recipe in enumerate(data, start=1):
+        if index == 1:
+            page.drawString(cursor_x, cursor_y, 'Cписок покупок:')
+        page.drawString(
+            cursor_x, cursor_y - INDENT,
+            f'{index}. {recipe["ingredients__name"]} - '
+            f'{recipe["amount"]} '
+            f'{recipe["ingredients__measurement_unit"]}.'
+        )
+        cursor_y -= INDENT
+        if cursor_y <= X_LIMITER:
+            page.showPage()
+            page.setFont('Font', LIST_SIZE)
+            cursor_y = Y_LIMITER
+    if not index:
+        page.setFont('Font', EMPTY_LIST_SIZE)
+        page.drawString(cursor_x, cursor_y, EMPTY_LIST)
     page.save()
     buffer.seek(0)
     return buffer
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_create(data):
+    """Построчная генерация списка покупок в формате csv."""
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for item in data:
+        yield writer.writerow((
+            item['ingredients__name'],
+            item['amount'],
+            item['ingredients__measurement_unit'],
+        ))
+
+
+def txt_create(data):
+    """Построчная генерация списка покупок в текстовом виде."""
+
+    index = 0
+    for index, item in enumerate(data, start=1):
+        yield (
+            f'{index}. {item["ingredients__name"]} - {item["amount"]} '
+            f'{item["ingredients__measurement_unit"]}.\n'
+        )
+    if not index:
+        yield f'{EMPTY_LIST}\n'
+
+
+def json_create(data):
+    """Построчная генерация списка покупок в формате json."""
+
+    separator = '['
+    for item in data:
+        yield separator + json.dumps(
+            {
+                'name': item['ingredients__name'],
+                'measurement_unit': item['ingredients__measurement_unit'],
+                'amount': item['amount'],
+            },
+            ensure_ascii=False,
+        )
+        separator = ',\n'
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', csv_create),
+    'txt': ('text/plain; charset=utf-8', txt_create),
+    'json': ('application/json', json_create),
+}
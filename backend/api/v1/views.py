@@ -1,31 +1,55 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from django.db.models.aggregates import Count, Sum
-from django.db.models.expressions import Exists, OuterRef, Value
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Q
+from django.http import (FileResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.http import parse_etags, quote_etag
 from django_filters import rest_framework
 from djoser.views import UserViewSet
-from rest_framework import generics, status, viewsets
+from rest_framework import generics, mixins, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action, api_view
+from rest_framework.parsers import (FileUploadParser, JSONParser,
+                                    MultiPartParser)
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from jobs.models import Job
+from jobs.queue import enqueue, result_storage
+from recipes.counters import change_counter
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
-                            Subscribe, Tag)
-
-from .filters import IngredientsFilter, RecipeFilter
-from .mixins import GetObjectMixin
-from .serializers import (IngredientSerializer, RecipeReadSerializer,
-                          RecipeWriteSerializer, SubscribeSerializer,
+                            ShoppingListItem, Subscribe, Tag, TimelineEntry)
+from recipes.tasks import backfill_timelines, fan_out_recipe, is_fanned_out
+
+from .authentication import sign_token
+from .bulk import import_recipes
+from .filters import RecipeFilter
+from .mixins import (AnonymousCacheMixin, ConditionalGetMixin,
+                     CursorPaginationMixin, GetObjectMixin)
+from .negotiation import IgnoreFormatContentNegotiation
+from .parsers import NDJSONParser
+from .pagination import KeysetPagination, SubscriptionsKeysetPagination
+from .permissions import IsAuthorOrAdminOrReadOnly
+from .serializers import (IngredientSerializer, JobSerializer,
+                          RecipeImageSerializer,
+                          RecipeReadSerializer, RecipeWriteSerializer,
+                          SubscribeSerializer,
                           TagSerializer, TokenSerializer, UserCreateSerializer,
                           UserListSerializer, UserPasswordSerializer)
-from .utils import pdf_create
+from .utils import (FILENAME_BASE, SHOPPING_LIST_FORMATS, get_shopping_list,
+                    get_shopping_list_pdf, shopping_list_digest)
 
-FILENAME = 'shoppingcart.pdf'
+FILENAME = f'{FILENAME_BASE}.pdf'
+UPLOAD_OVERHEAD = 64 * 1024
 
 User = get_user_model()
 
@@ -37,16 +61,10 @@ class AddAndDeleteSubscribe(
     """Класс для создания и удаления подписок."""
 
     serializer_class = SubscribeSerializer
+    query_budget = 12
 
     def get_queryset(self):
-        return self.request.user.follower.select_related(
-            'following'
-        ).prefetch_related(
-            'following__recipe'
-        ).annotate(
-            recipes_count=Count('following__recipe'),
-            is_subscribed=Value(True),
-        )
+        return self.request.user.follower.select_related('author')
 
     def create(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -60,7 +78,14 @@ class AddAndDeleteSubscribe(
                 {'errors': 'Вы уже подписаны на этого пользователя.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        subscribe = request.user.follower.create(author=instance)
+        with transaction.atomic():
+            subscribe = request.user.follower.create(author=instance)
+            change_counter(User, instance.id, 'followers_count', 1)
+            instance.refresh_from_db(fields=['followers_count'])
+            if is_fanned_out(instance.followers_count):
+                enqueue(
+                    backfill_timelines, [(request.user.id, instance.id)]
+                )
         serializer = self.get_serializer(subscribe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -71,7 +96,15 @@ class AddAndDeleteSubscribe(
         return user
 
     def perform_destroy(self, instance):
-        self.request.user.follower.filter(author=instance).delete()
+        with transaction.atomic():
+            deleted, _ = self.request.user.follower.filter(
+                author=instance
+            ).delete()
+            if deleted:
+                change_counter(User, instance.id, 'followers_count', -deleted)
+            TimelineEntry.objects.filter(
+                user=self.request.user, author=instance
+            ).delete()
 
 
 class AddDeleteFavoriteRecipe(
@@ -81,14 +114,29 @@ class AddDeleteFavoriteRecipe(
 ):
     """Добавление и удаление рецепта из списка избранных."""
 
+    query_budget = 8
+
     def create(self, request, *args, **kwargs):
         instance = self.get_object()
-        request.user.favorite_recipe.recipe.add(instance)
+        with transaction.atomic():
+            favorite_recipe = FavoriteRecipe.objects.select_for_update().get(
+                user=request.user
+            )
+            if not favorite_recipe.recipe.filter(id=instance.id).exists():
+                favorite_recipe.recipe.add(instance)
+                change_counter(Recipe, instance.id, 'favorites_count', 1)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.favorite_recipe.recipe.remove(instance)
+        with transaction.atomic():
+            deleted, _ = FavoriteRecipe.recipe.through.objects.filter(
+                favoriterecipe__user=self.request.user, recipe=instance
+            ).delete()
+            if deleted:
+                change_counter(
+                    Recipe, instance.id, 'favorites_count', -deleted
+                )
 
 
 class AddDeleteShoppingCart(
@@ -98,14 +146,32 @@ class AddDeleteShoppingCart(
 ):
     """Добавление и удаление рецепта из корзины."""
 
+    query_budget = 16
+
     def create(self, request, *args, **kwargs):
         instance = self.get_object()
-        request.user.shopping_cart.recipe.add(instance)
+        with transaction.atomic():
+            shopping_cart = ShoppingCart.objects.select_for_update().get(
+                user=request.user
+            )
+            if not shopping_cart.recipe.filter(id=instance.id).exists():
+                shopping_cart.recipe.add(instance)
+                ShoppingListItem.objects.add_recipe(request.user, instance)
+                change_counter(Recipe, instance.id, 'in_carts_count', 1)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_destroy(self, instance):
-        self.request.user.shopping_cart.recipe.remove(instance)
+        with transaction.atomic():
+            shopping_cart = ShoppingCart.objects.select_for_update().get(
+                user=self.request.user
+            )
+            if shopping_cart.recipe.filter(id=instance.id).exists():
+                shopping_cart.recipe.remove(instance)
+                ShoppingListItem.objects.remove_recipe(
+                    self.request.user, instance
+                )
+                change_counter(Recipe, instance.id, 'in_carts_count', -1)
 
 
 class AuthToken(ObtainAuthToken):
@@ -120,26 +186,36 @@ class AuthToken(ObtainAuthToken):
         user = serializer.validated_data['user']
         token, created = Token.objects.get_or_create(user=user)
         return Response(
-            {'auth_token': token.key},
+            {
+                'auth_token': (
+                    sign_token(user) if settings.AUTH_SIGNED_TOKENS
+                    else token.key
+                ),
+            },
             status=status.HTTP_201_CREATED
         )
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(ConditionalGetMixin, CursorPaginationMixin, UserViewSet):
     """Вьюсет для работы с моделью пользователя."""
 
     permission_classes = (AllowAny,)
+    cache_generations = ('users', 'recipes', 'counters')
+    query_budget = {
+        'list': 6,
+        'retrieve': 3,
+        'me': 3,
+        'create': 6,
+        'subscriptions': 10,
+    }
 
     def get_queryset(self):
-        if self.request.user.is_authenticated:
-            return User.objects.annotate(
-                is_subscribed=Exists(
-                    self.request.user.follower.filter(
-                        author=OuterRef('id'))
-                )).prefetch_related(
-                    'follower', 'following'
-            )
-        return User.objects.annotate(is_subscribed=Value(False))
+        return User.objects.all()
+
+    def get_cursor_pagination_class(self):
+        if self.action == 'subscriptions':
+            return SubscriptionsKeysetPagination
+        return None
 
     def get_serializer_class(self):
         if self.request.method.lower() == 'post':
@@ -154,8 +230,11 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         """Возвращает список подписок пользователя."""
 
+        return self.conditional_response(self.list_subscriptions, request)
+
+    def list_subscriptions(self, request):
         user = request.user
-        queryset = Subscribe.objects.filter(user=user)
+        queryset = Subscribe.objects.filter(user=user).select_related('author')
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             pages, many=True,
@@ -163,83 +242,319 @@ class UsersViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                     CursorPaginationMixin, viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
 
     permission_classes = (AllowAny,)
     filter_backends = (rest_framework.DjangoFilterBackend,)
     filterset_class = RecipeFilter
     queryset = Recipe.recipes_related.all()
+    count_generations = ('recipes',)
+    cache_generations = ('recipes', 'counters')
+    uncached_count_params = ('is_favorited', 'is_in_shopping_cart')
+    query_budget = {
+        'list': 10,
+        'retrieve': 8,
+        'create': 21,
+        'partial_update': 28,
+        'update': 28,
+        'destroy': 16,
+        'download_shopping_cart': 4,
+        'timeline': 8,
+        'bulk': 12,
+        'image': 14,
+    }
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is RecipeReadSerializer:
+            kwargs.setdefault('fields', self.get_projection())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_projection(self):
+        """Поля рецепта, запрошенные через параметры fields и expand."""
+
+        all_fields = set(RecipeReadSerializer.Meta.fields)
+        if self.action not in ('list', 'retrieve', 'timeline'):
+            return all_fields
+        params = self.request.query_params
+        if params.get('fields'):
+            fields = set(params['fields'].split(',')) & all_fields
+            fields.add('id')
+        elif self.action != 'retrieve':
+            fields = set(RecipeReadSerializer.list_fields)
+        else:
+            fields = all_fields
+        return fields | set(params.get('expand', '').split(',')) & all_fields
+
     def get_queryset(self):
-        queryset = self.queryset
-        tags = self.request.query_params.getlist('tags')
-        if tags:
-            queryset.filter(
-                tags__slug__in=tags
-            ).distinct()
-        if self.request.user.is_authenticated:
-            return queryset.annotate(
-                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
-                    user=self.request.user,
-                    recipe=OuterRef('id'))
-                ),
-                is_favorited=Exists(FavoriteRecipe.objects.filter(
-                    user=self.request.user, recipe=OuterRef('id'))
-                )
+        if self.action == 'destroy':
+            return Recipe.objects.select_related('author')
+        return Recipe.recipes_related.for_fields(self.get_projection())
+
+    def get_last_modified(self, request):
+        if self.action != 'retrieve' or request.user.is_authenticated:
+            return None
+        try:
+            updated_at = Recipe.objects.filter(
+                pk=self.kwargs['pk']
+            ).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+        if updated_at is None:
+            return None
+        return int(updated_at.timestamp())
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        with transaction.atomic():
+            recipe = serializer.save(author=user, merged_on_read=True)
+            change_counter(User, user.id, 'recipes_count', 1)
+            user.refresh_from_db(fields=['followers_count'])
+            enqueue(
+                fan_out_recipe, recipe.id, user.id, user.followers_count
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            ShoppingListItem.objects.remove_recipe_from_carts(instance)
+            instance.delete()
+            change_counter(User, instance.author_id, 'recipes_count', -1)
+
+    @action(detail=True,
+            methods=['put'],
+            permission_classes=(IsAuthenticated, IsAuthorOrAdminOrReadOnly),
+            parser_classes=(MultiPartParser, FileUploadParser))
+    def image(self, request, pk=None):
+        """Загрузка фото рецепта файлом в multipart или телом запроса.
+
+        Слишком большие запросы отклоняются по Content-Length, а чужие
+        рецепты - проверкой прав, до чтения тела.
+        """
+
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            return Response(
+                {'errors': 'Некорректный заголовок Content-Length.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if content_length > settings.RECIPE_IMAGE_MAX_SIZE + UPLOAD_OVERHEAD:
+            return Response(
+                {'errors': f'Файл больше {settings.RECIPE_IMAGE_MAX_SIZE} '
+                           f'байт.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             )
-        return queryset.annotate(
-            is_in_shopping_cart=Value(False),
-            is_favorited=Value(False)
+        recipe = self.get_object()
+        files = request.FILES
+        serializer = RecipeImageSerializer(
+            recipe,
+            data={'image': files.get('image') or files.get('file')},
+            context=self.get_serializer_context(),
         )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
 
-    def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+    @action(detail=False,
+            methods=['post'],
+            permission_classes=(IsAuthenticated,),
+            parser_classes=(JSONParser, NDJSONParser))
+    def bulk(self, request):
+        """Импорт массива рецептов или ndjson одной транзакцией."""
+
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'errors': 'Ожидается массив рецептов.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > settings.RECIPE_BULK_MAX_ITEMS:
+            return Response(
+                {'errors': f'Не больше {settings.RECIPE_BULK_MAX_ITEMS} '
+                           f'рецептов за запрос.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        recipes, errors = import_recipes(items, request)
+        return Response(
+            {
+                'created': [recipe.id for recipe in recipes],
+                'errors': errors,
+            },
+            status=(
+                status.HTTP_201_CREATED if recipes
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def timeline(self, request):
+        """Лента новых рецептов авторов, на которых подписан пользователь.
+
+        Рецепты обычных авторов берутся из ленты пользователя. Рецепты
+        авторов с очень большим числом подписчиков, а также ещё не
+        разосланные по лентам, подмешиваются при чтении.
+        """
+
+        user = request.user
+        queryset = self.get_queryset().filter(
+            Q(id__in=TimelineEntry.objects.filter(
+                user=user
+            ).values('recipe_id'))
+            | Q(author_id__in=user.follower.filter(
+                author__followers_count__gt=(
+                    settings.TIMELINE_FANOUT_THRESHOLD
+                )
+            ).values('author_id'))
+            | Q(merged_on_read=True, author_id__in=user.follower.values(
+                'author_id'
+            ))
+        )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False,
             methods=['get'],
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            content_negotiation_class=IgnoreFormatContentNegotiation)
     def download_shopping_cart(self, request):
-        """Создание списка с ингредиентами в pdf-файле."""
-
-        shopping_cart = (
-            request.user.shopping_cart.recipe.
-            values(
-                'ingredients__name',
-                'ingredients__measurement_unit'
-            ).annotate(amount=Sum('foreign_recipes__amount')).order_by()
+        """Выгрузка списка с ингредиентами в pdf, csv, txt или json."""
+
+        export_format = request.query_params.get('format', 'pdf')
+        if export_format != 'pdf' and (
+                export_format not in SHOPPING_LIST_FORMATS):
+            return Response(
+                {'errors': f'Формат {export_format} не поддерживается.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        shopping_list = get_shopping_list(request.user)
+        digest = shopping_list_digest(shopping_list.iterator())
+        etag = quote_etag(f'{export_format}-{digest}')
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and etag in parse_etags(if_none_match):
+            response = HttpResponseNotModified()
+        elif export_format == 'pdf':
+            response = FileResponse(
+                get_shopping_list_pdf(shopping_list.iterator(), digest),
+                as_attachment=True,
+                filename=FILENAME,
+            )
+        else:
+            content_type, writer = SHOPPING_LIST_FORMATS[export_format]
+            response = StreamingHttpResponse(
+                writer(shopping_list.iterator()),
+                content_type=content_type,
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{FILENAME_BASE}.{export_format}"'
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class JobsViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                  mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Фоновые задачи пользователя: постановка, статус и результат."""
+
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+    query_budget = {'list': 4, 'retrieve': 3, 'create': 4, 'result': 3}
+
+    def get_queryset(self):
+        return self.request.user.jobs.all()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save()
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': request.build_absolute_uri(
+                reverse('api:v1:job-detail', args=(job.id,))
+            )},
         )
-        complete_pdf = pdf_create(shopping_cart)
+
+    @action(detail=True)
+    def result(self, request, pk=None):
+        """Результат выполненной задачи: файл или json."""
+
+        job = self.get_object()
+        if job.status != Job.DONE:
+            return Response(
+                {'status': job.status}, status=status.HTTP_409_CONFLICT
+            )
+        result = job.result
+        if not isinstance(result, dict) or 'file' not in result:
+            return Response({'result': result})
+        if not result_storage.exists(result['file']):
+            return Response(
+                {'errors': 'Результат задачи уже удалён.'},
+                status=status.HTTP_410_GONE,
+            )
         return FileResponse(
-            complete_pdf,
+            result_storage.open(result['file']),
             as_attachment=True,
-            filename=FILENAME,
+            filename=result['filename'],
+            content_type=result['content_type'],
         )
 
 
-class TagsViewSet(ReadOnlyModelViewSet):
+class TagsViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                  ReadOnlyModelViewSet):
     """Cписок тегов для статей."""
 
     queryset = Tag.objects.all()
+    cache_generations = ('tags',)
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    query_budget = 2
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                         ReadOnlyModelViewSet):
     """Вьюсет для выбора ингредиентов."""
 
     queryset = Ingredient.objects.all()
+    cache_generations = ('ingredients',)
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (IngredientsFilter,)
-    search_fields = ('^name',)
+    query_budget = {'list': 1, 'retrieve': 1}
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            partial(self.cached_response, self.search),
+            request, *args, **kwargs,
+        )
+
+    def search(self, request, *args, **kwargs):
+        """Поиск ингредиентов по индексу в памяти, без обращения к БД."""
+
+        try:
+            limit = min(
+                int(request.query_params.get(
+                    'limit', settings.INGREDIENT_SEARCH_LIMIT
+                )),
+                settings.INGREDIENT_SEARCH_MAX_LIMIT,
+            )
+        except ValueError:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        ingredients = ingredient_index.search(
+            request.query_params.get('name', ''), max(limit, 0)
+        )
+        return Response(self.get_serializer(ingredients, many=True).data)
 
 
 @api_view(['post'])
@@ -20,6 +20,10 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 FONT_PATH = Path(BASE_DIR, 'fonts', 'BalsamiqSans-Regular.ttf').resolve()
+SHOPPING_LIST_PDF_CACHE_SIZE = int(getenv('SHOPPING_LIST_PDF_CACHE_SIZE', 256))
+SHOPPING_LIST_PDF_CACHE_BYTES = int(
+    getenv('SHOPPING_LIST_PDF_CACHE_BYTES', 32 * 1024 * 1024)
+)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
@@ -33,6 +37,34 @@ SECRET_KEY = (
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = (getenv('DEBUG', 'False') == 'True')
 
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+QUERY_BUDGET_STRICT = (getenv('QUERY_BUDGET_STRICT', 'False') == 'True')
+TIMELINE_FANOUT_THRESHOLD = int(getenv('TIMELINE_FANOUT_THRESHOLD', 10000))
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_BACKFILL_SIZE = 50
+RECIPE_BULK_MAX_ITEMS = int(getenv('RECIPE_BULK_MAX_ITEMS', 500))
+RECIPE_BULK_WORKERS = int(getenv('RECIPE_BULK_WORKERS', 4))
+RECIPE_IMAGE_SIZES = {
+    'thumb': (150, 150),
+    'card': (600, 400),
+    'detail': (1200, 800),
+}
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+RECIPE_IMAGE_QUALITY = 82
+RECIPE_IMAGE_MAX_SIZE = int(getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = int(getenv('RECIPE_IMAGE_MAX_PIXELS', 40_000_000))
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+JOB_MODULES = ('recipes.tasks', 'api.v1.tasks')
+JOB_WORKERS = int(getenv('JOB_WORKERS', 4))
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 10
+JOB_TIMEOUT = int(getenv('JOB_TIMEOUT', 600))
+JOB_RESULT_TTL = int(getenv('JOB_RESULT_TTL', 24 * 60 * 60))
+JOBS_EAGER = (getenv('JOBS_EAGER', 'False') == 'True')
+ASYNC_VIEWS = (getenv('ASYNC_VIEWS', 'False') == 'True')
+ASYNC_DB_WORKERS = int(getenv('ASYNC_DB_WORKERS', 16))
+
 ALLOWED_HOSTS = [
     '158.160.17.231',
     'localhost',
@@ -56,11 +88,13 @@ INSTALLED_APPS = [
     'django_filters',
     'recipes',
     'users',
+    'jobs',
     'api',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -106,6 +140,37 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': getenv('CACHE_LOCATION', default='foodgram'),
+    },
+    'responses': {
+        'BACKEND': getenv(
+            'RESPONSE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': getenv('RESPONSE_CACHE_LOCATION', default='responses'),
+        'TIMEOUT': int(getenv('RESPONSE_CACHE_STALE_TIMEOUT', 3600)),
+    },
+}
+
+RESPONSE_CACHE_TIMEOUT = int(getenv('RESPONSE_CACHE_TIMEOUT', 60))
+RESPONSE_CACHE_LOCK_TIMEOUT = int(getenv('RESPONSE_CACHE_LOCK_TIMEOUT', 30))
+AUTH_TOKEN_CACHE_SIZE = int(getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_LOCAL_TTL = int(getenv('AUTH_TOKEN_LOCAL_TTL', 60))
+AUTH_TOKEN_CACHE_TIMEOUT = int(getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+AUTH_SIGNED_TOKENS = (getenv('AUTH_SIGNED_TOKENS', 'False') == 'True')
+AUTH_SIGNED_TOKEN_MAX_AGE = int(
+    getenv('AUTH_SIGNED_TOKEN_MAX_AGE', 7 * 24 * 60 * 60)
+)
+
+COUNT_CACHE_TIMEOUT = int(getenv('COUNT_CACHE_TIMEOUT', 300))
+COUNT_ESTIMATE_THRESHOLD = int(getenv('COUNT_ESTIMATE_THRESHOLD', 100000))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -131,7 +196,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.v1.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -194,6 +259,7 @@ STATIC_URL = '/static/'
 STATIC_ROOT = Path(BASE_DIR, 'static').resolve()
 MEDIA_URL = '/media/'
 MEDIA_ROOT = Path(BASE_DIR, 'media').resolve()
+JOB_RESULT_ROOT = Path(BASE_DIR, 'job_results').resolve()
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
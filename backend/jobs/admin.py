@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'attempts',
+        'user',
+        'created_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'user__email')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
@@ -0,0 +1,83 @@
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.queue import claim, purge, run
+from recipes.generations import is_shared_cache
+
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    """Команда обработчика очереди фоновых задач.
+
+    Забирает задачи из таблицы и выполняет их в пуле потоков. По SIGTERM
+    перестаёт брать новые задачи и дожидается начатых.
+    """
+
+    help = 'Обработка очереди фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.JOB_WORKERS
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            raise CommandError(
+                'Обработчику нужен общий с веб-сервером кэш CACHE_BACKEND, '
+                'иначе сброс кэшей после задач не дойдёт до веб-сервера. '
+                'Без отдельного обработчика задайте JOBS_EAGER=True.'
+            )
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        workers = options['workers']
+        running = set()
+        purged_at = None
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='job'
+        ) as executor:
+            while not self.stopping:
+                if purged_at is None or (
+                        time.monotonic() - purged_at > PURGE_INTERVAL):
+                    self.purge()
+                    purged_at = time.monotonic()
+                ids = []
+                if len(running) < workers:
+                    ids = claim(workers - len(running))
+                    connections.close_all()
+                running |= {executor.submit(run, job_id) for job_id in ids}
+                if ids:
+                    continue
+                if not running and options['once']:
+                    break
+                if running:
+                    _, running = wait(
+                        running,
+                        timeout=options['poll_interval'],
+                        return_when=FIRST_COMPLETED,
+                    )
+                else:
+                    time.sleep(options['poll_interval'])
+            wait(running)
+        self.stdout.write(self.style.SUCCESS('Обработчик задач остановлен.'))
+
+    def purge(self):
+        purged = purge(timedelta(seconds=settings.JOB_RESULT_TTL))
+        if purged:
+            self.stdout.write(f'Удалено завершённых задач: {purged}')
+
+    def stop(self, signum, frame):
+        self.stopping = True
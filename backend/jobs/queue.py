@@ -0,0 +1,137 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import JOBS, JobError
+
+logger = logging.getLogger(__name__)
+result_storage = FileSystemStorage(location=settings.JOB_RESULT_ROOT)
+
+
+def enqueue(function, *args, user=None, **kwargs):
+    """Ставит задачу в очередь в текущей транзакции.
+
+    Задача видна обработчику только после фиксации транзакции. При
+    JOBS_EAGER задача выполняется сразу после фиксации в этом же процессе.
+    """
+
+    name = getattr(function, 'job_name', function)
+    if name not in JOBS:
+        raise LookupError(f'Задача {name} не зарегистрирована.')
+    new_job = Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        user=user,
+        max_attempts=JOBS[name].max_attempts,
+    )
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: execute_now(new_job.id))
+    return new_job
+
+
+def execute_now(job_id):
+    """Выполняет задачу в текущем процессе, минуя обработчик очереди."""
+
+    Job.objects.filter(id=job_id).update(
+        status=Job.RUNNING,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    )
+    execute(job_id)
+
+
+def claim(limit):
+    """Забирает из очереди до limit готовых к запуску задач.
+
+    Задачи, зависшие в работе дольше JOB_TIMEOUT, например после падения
+    обработчика, тоже считаются готовыми.
+    """
+
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                Q(status=Job.QUEUED, run_at__lte=now)
+                | Q(
+                    status=Job.RUNNING,
+                    started_at__lt=now - timedelta(
+                        seconds=settings.JOB_TIMEOUT
+                    ),
+                )
+            ).order_by('run_at').values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(id__in=ids).update(
+            status=Job.RUNNING, started_at=now, attempts=F('attempts') + 1
+        )
+    return ids
+
+
+def execute(job_id):
+    """Выполняет задачу и сохраняет результат или планирует повтор.
+
+    Повторы откладываются экспоненциально: JOB_RETRY_DELAY, затем вдвое
+    дольше при каждой следующей попытке.
+    """
+
+    current = Job.objects.get(id=job_id)
+    try:
+        if current.attempts > current.max_attempts:
+            raise RuntimeError('Превышено число попыток.')
+        if current.name not in JOBS:
+            raise LookupError(f'Задача {current.name} не зарегистрирована.')
+        result = JOBS[current.name](*current.args, **current.kwargs)
+    except Exception as error:
+        logger.exception('Ошибка фоновой задачи %s', current.name)
+        now = timezone.now()
+        if current.attempts < current.max_attempts and (
+                not isinstance(error, JobError)):
+            changes = {
+                'status': Job.QUEUED,
+                'run_at': now + timedelta(
+                    seconds=settings.JOB_RETRY_DELAY
+                    * 2 ** max(current.attempts - 1, 0)
+                ),
+            }
+        else:
+            changes = {'status': Job.FAILED, 'finished_at': now}
+        Job.objects.filter(id=job_id).update(
+            error=traceback.format_exc(), **changes
+        )
+        return
+    Job.objects.filter(id=job_id).update(
+        status=Job.DONE, result=result, finished_at=timezone.now()
+    )
+
+
+def run(job_id):
+    try:
+        execute(job_id)
+    except Exception:
+        logger.exception('Ошибка обработчика задачи %s', job_id)
+    finally:
+        connections.close_all()
+
+
+def purge(older_than):
+    """Удаляет завершённые задачи старше older_than и файлы их результатов.
+
+    Возвращает число удалённых задач.
+    """
+
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished_at__lt=timezone.now() - older_than,
+    )
+    for result in finished.exclude(result=None).values_list(
+            'result', flat=True).iterator():
+        if isinstance(result, dict) and 'file' in result:
+            result_storage.delete(result['file'])
+    return finished.delete()[0]
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+JOBS = {}
+
+
+class JobError(Exception):
+    """Ошибка задачи, при которой повторять её бесполезно."""
+
+
+def job(function=None, *, public=False, max_attempts=None):
+    """Регистрирует функцию как фоновую задачу под её именем.
+
+    Публичные задачи пользователь может поставить в очередь через API,
+    идентификатор пользователя передаётся им в аргументе user_id.
+    """
+
+    def register(function):
+        name = function.__name__
+        if name in JOBS:
+            raise ImproperlyConfigured(f'Задача {name} уже зарегистрирована.')
+        function.job_name = name
+        function.public = public
+        function.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        JOBS[name] = function
+        return function
+
+    if function is None:
+        return register
+    return register(function)
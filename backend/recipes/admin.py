@@ -6,8 +6,10 @@ from .models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListItem,
     Subscribe,
-    Tag
+    Tag,
+    TimelineEntry
 )
 
 EMPTY_DISPLAY = '-пусто-'
@@ -31,7 +33,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'cooking_time',
         'get_tags',
         'pub_date',
-        'get_favorite_count',
+        'favorites_count',
+        'in_carts_count',
     )
     list_display_links = ('id', 'name', 'text', 'image_tag', 'pub_date',)
     search_fields = (
@@ -53,10 +56,6 @@ class RecipeAdmin(admin.ModelAdmin):
         list_ = [_.name for _ in obj.tags.all()]
         return ', '.join(list_)
 
-    @admin.display(description='В избранном')
-    def get_favorite_count(self, obj):
-        return obj.favorite_recipe.count()
-
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -112,3 +111,19 @@ class SoppingCartAdmin(admin.ModelAdmin):
     @admin.display(description='В избранных')
     def get_count(self, obj):
         return obj.recipe.count()
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    search_fields = ('user__email', 'ingredient__name',)
+    list_select_related = ('user', 'ingredient')
+    empty_value_display = EMPTY_DISPLAY
+
+
+@admin.register(TimelineEntry)
+class TimelineEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'author', 'recipe')
+    search_fields = ('user__email', 'author__email', 'recipe__name',)
+    list_select_related = ('user', 'author', 'recipe')
+    empty_value_display = EMPTY_DISPLAY
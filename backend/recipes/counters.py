@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .generations import bump_generation
+from .models import FavoriteRecipe, Recipe, ShoppingCart, Subscribe
+
+User = get_user_model()
+
+COUNTERS = {
+    'favorites_count': (Recipe, FavoriteRecipe.recipe.through, 'recipe_id'),
+    'in_carts_count': (Recipe, ShoppingCart.recipe.through, 'recipe_id'),
+    'recipes_count': (User, Recipe, 'author_id'),
+    'followers_count': (User, Subscribe, 'author_id'),
+}
+
+
+def touch(model):
+    """Отметка времени изменения для моделей, у которых она есть."""
+
+    if hasattr(model, 'updated_at'):
+        return {'updated_at': timezone.now()}
+    return {}
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет денормализованный счётчик на delta.
+
+    Счётчик не опускается ниже нуля, даже если строки появились в обход
+    него, например из фикстур или админки. Дата изменения записи
+    сдвигается, чтобы Last-Modified учитывал счётчик.
+    """
+
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}, **touch(model)
+    )
+    transaction.on_commit(lambda: bump_generation('counters'))
+
+
+def reconcile_counter(field, batch_size=1000, dry_run=False):
+    """Сверяет счётчик с реальным числом строк пачками по первичному ключу.
+
+    Возвращает число строк, в которых значение разошлось.
+    """
+
+    model, source, key = COUNTERS[field]
+    drifted, last_pk = 0, 0
+    while True:
+        batch = list(
+            model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', field
+            )[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        actual = dict(
+            source.objects.filter(
+                **{f'{key}__in': [pk for pk, _ in batch]}
+            ).values_list(key).annotate(total=Count('pk')).order_by()
+        )
+        changed = [
+            model(pk=pk, **{field: actual.get(pk, 0)}, **touch(model))
+            for pk, value in batch if value != actual.get(pk, 0)
+        ]
+        drifted += len(changed)
+        if changed and not dry_run:
+            model.objects.bulk_update(changed, [field, *touch(model)])
+    if drifted and not dry_run:
+        bump_generation('counters')
+    return drifted
@@ -0,0 +1,48 @@
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY_PREFIX = 'generation'
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def make_key(name):
+    return f'{KEY_PREFIX}:{name}'
+
+
+def user_generation(user_id):
+    """Имя поколения данных, которые видит только этот пользователь."""
+
+    return f'user:{user_id}'
+
+
+def is_shared_cache():
+    """Видят ли все процессы одни и те же поколения."""
+
+    return not isinstance(
+        caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_BACKENDS
+    )
+
+
+def get_generations(*names):
+    """Текущие номера поколений данных для построения ключей кэша."""
+
+    keys = [make_key(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return tuple(values[key] for key in keys)
+
+
+def bump_generation(*names):
+    """Инвалидирует всё, что закэшировано для указанных данных."""
+
+    for name in names:
+        try:
+            cache.incr(make_key(name))
+        except ValueError:
+            cache.set(make_key(name), time.time_ns(), None)
@@ -0,0 +1,99 @@
+import hashlib
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from PIL import Image
+
+HASH_CHUNK_SIZE = 64 * 1024
+DERIVATIVES_DIR = 'derivatives'
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+UPLOAD_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+
+Image.MAX_IMAGE_PIXELS = settings.RECIPE_IMAGE_MAX_PIXELS
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по sha256 содержимого.
+
+    Одинаковые загрузки сохраняются один раз, а имя файла меняется вместе
+    с содержимым, поэтому файлы можно кэшировать навсегда.
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(
+            posixpath.dirname(name), digest[:2], digest + extension
+        )
+        return self.save_as(name, content)
+
+    def save_as(self, name, content):
+        """Сохраняет файл под точным именем, если его ещё нет."""
+
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+
+recipe_image_storage = ContentHashStorage()
+
+
+def read_image_header(file):
+    """Формат и размеры изображения по заголовку, без распаковки пикселей."""
+
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            return image.format, image.size
+    finally:
+        file.seek(0)
+
+
+def derivative_name(name, size, image_format):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, DERIVATIVES_DIR, f'{stem}_{size}.{image_format}'
+    )
+
+
+def render_derivative(image, box, image_format):
+    derivative = image.copy()
+    derivative.thumbnail(box, Image.LANCZOS)
+    buffer = io.BytesIO()
+    derivative.save(
+        buffer,
+        PIL_FORMATS[image_format],
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=True,
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def create_derivatives(storage, name):
+    """Уменьшенные копии изображения во всех размерах и форматах.
+
+    Возвращает словарь {размер: {формат: имя файла}}.
+    """
+
+    with storage.open(name) as file, Image.open(file) as image:
+        image = image.convert('RGB')
+    derivatives = {}
+    for size, box in settings.RECIPE_IMAGE_SIZES.items():
+        derivatives[size] = {}
+        for image_format in settings.RECIPE_IMAGE_FORMATS:
+            path = derivative_name(name, size, image_format)
+            if not storage.exists(path):
+                path = storage.save_as(
+                    path, render_derivative(image, box, image_format)
+                )
+            derivatives[size][image_format] = path
+    return derivatives
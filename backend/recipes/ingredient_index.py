@@ -0,0 +1,76 @@
+import threading
+from bisect import bisect_left
+
+from .generations import get_generations
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов для поиска по префиксу.
+
+    Индекс загружается при первом поиске и запоминает поколение
+    ingredients, при котором построен. Как только поколение сменилось,
+    в этом процессе или в любом другом, индекс перечитывается.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._generation = None
+
+    def invalidate(self):
+        self._generation = None
+
+    def is_stale(self, generation):
+        return self._generation is None or self._generation != generation
+
+    def load(self, generation):
+        from .models import Ingredient
+
+        entries = sorted(
+            (
+                (ingredient.name.casefold(), ingredient.id, ingredient)
+                for ingredient in Ingredient.objects.only(
+                    'id', 'name', 'measurement_unit'
+                ).iterator()
+            ),
+            key=lambda entry: entry[:2],
+        )
+        self._index = (
+            [entry[0] for entry in entries],
+            [entry[2] for entry in entries],
+        )
+        self._generation = generation
+
+    def get(self):
+        generation = get_generations('ingredients')[0]
+        if self.is_stale(generation):
+            with self._lock:
+                if self.is_stale(generation):
+                    self.load(generation)
+        return self._index
+
+    def search(self, query, limit):
+        """Ингредиенты по релевантности: совпадение, префикс, подстрока."""
+
+        keys, entries = self.get()
+        query = query.strip().casefold()
+        if not query:
+            return entries[:limit]
+        results = []
+        position = bisect_left(keys, query)
+        while (
+            position < len(keys)
+            and len(results) < limit
+            and keys[position].startswith(query)
+        ):
+            results.append(entries[position])
+            position += 1
+        for key, entry in zip(keys, entries):
+            if len(results) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                results.append(entry)
+        return results
+
+
+ingredient_index = IngredientIndex()
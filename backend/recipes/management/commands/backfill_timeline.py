@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipes.models import Subscribe
+from recipes.tasks import backfill_timelines
+
+
+class Command(BaseCommand):
+    """Команда для заполнения лент по уже существующим подпискам."""
+
+    help = 'Заполнение лент подписок последними рецептами авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Заполнить ленты только указанных id пользователей.',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Subscribe.objects.filter(
+            author__followers_count__lte=settings.TIMELINE_FANOUT_THRESHOLD
+        )
+        if options['users']:
+            queryset = queryset.filter(user_id__in=options['users'])
+        total, last_id = 0, 0
+        while True:
+            batch = list(
+                queryset.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'user_id', 'author_id'
+                )[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            total += backfill_timelines(
+                (user_id, author_id) for _, user_id, author_id in batch
+            )
+            self.stdout.write(f'Обработано подписок до id {last_id}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены, обработано записей: {total}.'
+        ))
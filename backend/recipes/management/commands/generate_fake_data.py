@@ -0,0 +1,289 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.counters import COUNTERS, reconcile_counter
+from recipes.generations import bump_generation
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            Subscribe, Tag)
+
+User = get_user_model()
+PASSWORD = 'foodgram-fake-password'
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+DAYS = 365
+LOOKUP_SIZE = 500
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def zipf_weights(size, skew):
+    """Накопленные веса распределения Ципфа для выбора популярных объектов."""
+
+    return list(accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+
+@contextmanager
+def manual_pub_date():
+    """Позволяет задавать дату публикации рецепта вручную."""
+
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    """Команда для генерации синтетических данных для нагрузочных тестов."""
+
+    help = 'Генерация пользователей, рецептов, подписок, избранного и корзин'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Сколько ингредиентов создать, если каталог пуст.',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2,
+            default=(3, 12), metavar=('MIN', 'MAX'),
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число избранных рецептов пользователя.',
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее число рецептов в корзине пользователя.',
+        )
+        parser.add_argument(
+            '--heavy-carts', type=float, default=0.05,
+            help='Доля пользователей с большой корзиной.',
+        )
+        parser.add_argument('--heavy-cart-size', type=int, default=100)
+        parser.add_argument(
+            '--author-skew', type=float, default=1.1,
+            help='Показатель Ципфа для популярности авторов.',
+        )
+        parser.add_argument(
+            '--recipe-skew', type=float, default=1.0,
+            help='Показатель Ципфа для популярности рецептов.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='fake',
+            help='Префикс имён пользователей и рецептов этого запуска.',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с префиксом {self.prefix} уже сгенерированы.'
+            )
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not tag_ids:
+            raise CommandError('Сначала импортируйте тэги: import_tags.')
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        user_ids = self.create_users(options['users'])
+        author_weights = zipf_weights(len(user_ids), options['author_skew'])
+        recipe_ids = self.create_recipes(
+            options['recipes'],
+            user_ids,
+            author_weights,
+            tag_ids,
+            ingredient_ids,
+            options['ingredients_per_recipe'],
+        )
+        self.create_subscriptions(
+            user_ids, author_weights, options['subscriptions']
+        )
+        recipe_weights = zipf_weights(len(recipe_ids), options['recipe_skew'])
+        self.fill_collections(
+            FavoriteRecipe, user_ids, recipe_ids, recipe_weights,
+            lambda: options['favorites'],
+        )
+        self.fill_collections(
+            ShoppingCart, user_ids, recipe_ids, recipe_weights,
+            lambda: (
+                options['heavy_cart_size']
+                if self.random.random() < options['heavy_carts']
+                else options['cart']
+            ),
+        )
+        ShoppingListItem.objects.rebuild()
+        for field in COUNTERS:
+            reconcile_counter(field, self.batch_size)
+        bump_generation('ingredients', 'users', 'recipes', 'counters')
+        self.stdout.write(self.style.SUCCESS(
+            'Синтетические данные успешно сгенерированы.'
+        ))
+
+    def bulk_create(self, model, objects):
+        total = 0
+        with transaction.atomic():
+            for batch in batched(objects, self.batch_size):
+                model.objects.bulk_create(
+                    batch, batch_size=self.batch_size, ignore_conflicts=True
+                )
+                total += len(batch)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
+
+    def create_ingredients(self, count):
+        if not Ingredient.objects.exists():
+            self.bulk_create(Ingredient, (
+                Ingredient(
+                    name=f'{self.prefix} ингредиент {index}',
+                    measurement_unit=self.random.choice(UNITS),
+                )
+                for index in range(count)
+            ))
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        self.bulk_create(User, (
+            User(
+                username=f'{self.prefix}{index}',
+                email=f'{self.prefix}{index}@example.com',
+                first_name=f'Имя{index}',
+                last_name=f'Фамилия{index}',
+                password=password,
+            )
+            for index in range(count)
+        ))
+        user_ids = list(
+            User.objects.filter(
+                username__startswith=self.prefix
+            ).order_by('id').values_list('id', flat=True)
+        )
+        for model in (FavoriteRecipe, ShoppingCart):
+            self.bulk_create(
+                model, (model(user_id=user_id) for user_id in user_ids)
+            )
+        return user_ids
+
+    def create_recipes(self, count, user_ids, author_weights, tag_ids,
+                       ingredient_ids, ingredients_per_recipe):
+        now = timezone.now()
+        recipe_ids = []
+        with manual_pub_date(), transaction.atomic():
+            for start in range(0, count, self.batch_size):
+                size = min(self.batch_size, count - start)
+                authors = self.random.choices(
+                    user_ids, cum_weights=author_weights, k=size
+                )
+                names = [
+                    f'{self.prefix} рецепт {index}'
+                    for index in range(start, start + size)
+                ]
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author_id=author_id,
+                        name=name,
+                        text=f'Описание рецепта {name}.',
+                        cooking_time=self.random.randint(1, 180),
+                        pub_date=now - timedelta(
+                            seconds=self.random.randint(0, DAYS * 86400)
+                        ),
+                    )
+                    for author_id, name in zip(authors, names)
+                )
+                batch_ids = [recipe.pk for recipe in recipes]
+                if None in batch_ids:
+                    batch_ids = [
+                        recipe_id
+                        for chunk in batched(names, LOOKUP_SIZE)
+                        for recipe_id in Recipe.objects.filter(
+                            name__in=chunk
+                        ).values_list('id', flat=True)
+                    ]
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in batch_ids
+                    for tag_id in self.random.sample(
+                        tag_ids, self.random.randint(1, len(tag_ids))
+                    )
+                )
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.random.randint(1, 500),
+                    )
+                    for recipe_id in batch_ids
+                    for ingredient_id in self.random.sample(
+                        ingredient_ids,
+                        min(
+                            len(ingredient_ids),
+                            self.random.randint(*ingredients_per_recipe),
+                        ),
+                    )
+                )
+                recipe_ids += batch_ids
+                self.stdout.write(f'Рецепты: {len(recipe_ids)} из {count}')
+        return recipe_ids
+
+    def create_subscriptions(self, user_ids, author_weights, average):
+        def subscriptions():
+            for user_id in user_ids:
+                authors = set(self.random.choices(
+                    user_ids,
+                    cum_weights=author_weights,
+                    k=self.random.randint(0, average * 2),
+                ))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Subscribe(user_id=user_id, author_id=author_id)
+
+        self.bulk_create(Subscribe, subscriptions())
+
+    def fill_collections(self, model, user_ids, recipe_ids, recipe_weights,
+                         get_size):
+        """Наполняет избранное или корзины пользователей рецептами."""
+
+        through = model.recipe.through
+        owner_field = f'{model._meta.model_name}_id'
+        owners = [
+            owner_id
+            for chunk in batched(user_ids, LOOKUP_SIZE)
+            for owner_id in model.objects.filter(
+                user_id__in=chunk
+            ).values_list('id', flat=True)
+        ]
+
+        def rows():
+            for owner_id in owners:
+                recipes = set(self.random.choices(
+                    recipe_ids,
+                    cum_weights=recipe_weights,
+                    k=self.random.randint(0, get_size() * 2),
+                ))
+                for recipe_id in recipes:
+                    yield through(**{owner_field: owner_id,
+                                     'recipe_id': recipe_id})
+
+        self.bulk_create(through, rows())
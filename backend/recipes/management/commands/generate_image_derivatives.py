@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+from recipes.tasks import generate_image_derivatives
+
+
+class Command(BaseCommand):
+    """Команда для создания уменьшенных копий фото уже загруженных рецептов."""
+
+    help = 'Создание уменьшенных копий фото рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для рецептов, у которых они уже есть.',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.exclude(image='')
+        if not options['all']:
+            queryset = queryset.filter(image_derivatives={})
+        total, last_id = 0, 0
+        while True:
+            batch = list(
+                queryset.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', flat=True
+                )[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]
+            total += generate_image_derivatives(batch)
+            self.stdout.write(f'Обработано рецептов до id {last_id}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Копии фото созданы для рецептов: {total}.'
+        ))
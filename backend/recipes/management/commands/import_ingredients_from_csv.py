@@ -1,27 +1,135 @@
 import csv
+import io
+import json
+from itertools import islice
 from pathlib import Path
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.generations import bump_generation
 from recipes.models import Ingredient
 
+CHUNK_SIZE = 64 * 1024
+STAGING_TABLE = 'recipes_ingredient_staging'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Потоковое чтение json-массива объектов без загрузки файла целиком."""
+
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается json-массив ингредиентов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Json-файл с ингредиентами повреждён.')
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
 
 class Command(BaseCommand):
-    """Команда для импорта списка ингридиентов из csv-файла."""
-
-    help = 'Импорт данных из csv файла'
-
-    def handle(self, *args, **kwargs):
-        path = Path(settings.BASE_DIR, 'data', 'ingredients.csv').resolve()
-        with open(path, mode="r", encoding="utf-8") as file:
-            reader = csv.reader(file)
-            for row in reader:
-                db = Ingredient(
-                    name=row[0],
-                    measurement_unit=row[1],
-                )
-                db.save()
+    """Команда для импорта списка ингридиентов из csv- или json-файла."""
+
+    help = 'Импорт данных из csv или json файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=Path(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            type=Path,
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['path'].resolve()
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла {path}.')
+        before = Ingredient.objects.count()
+        with open(path, mode='r', encoding='utf-8') as file:
+            rows = (
+                (name.strip(), measurement_unit.strip())
+                for name, measurement_unit in READERS[file_format](file)
+                if name.strip()
+            )
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    self.copy_rows(rows, options['batch_size'])
+                else:
+                    self.insert_rows(rows, options['batch_size'])
+        bump_generation('ingredients')
         self.stdout.write(self.style.SUCCESS(
-            'Ингредиенты из csv-файла успешно загружены.'
+            f'Ингредиенты успешно загружены, новых: '
+            f'{Ingredient.objects.count() - before}.'
         ))
+
+    def batches(self, rows, batch_size):
+        total = 0
+        batch = list(islice(rows, batch_size))
+        while batch:
+            yield batch
+            total += len(batch)
+            self.stdout.write(f'Обработано строк: {total}')
+            batch = list(islice(rows, batch_size))
+
+    def insert_rows(self, rows, batch_size):
+        for batch in self.batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ),
+                ignore_conflicts=True,
+            )
+
+    def copy_rows(self, rows, batch_size):
+        """Загрузка через COPY во временную таблицу и INSERT без дублей."""
+
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+                f'(name varchar(255), measurement_unit varchar(64)) '
+                f'ON COMMIT DROP'
+            )
+            for batch in self.batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY {STAGING_TABLE} (name, measurement_unit) '
+                    f'FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit FROM {STAGING_TABLE} '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
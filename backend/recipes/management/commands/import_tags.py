@@ -1,5 +1,6 @@
 from django.core.management import BaseCommand
 
+from recipes.generations import bump_generation
 from recipes.models import Tag
 
 
@@ -15,4 +16,5 @@ class Command(BaseCommand):
             {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
         ]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        bump_generation('tags')
         self.stdout.write(self.style.SUCCESS('Тэги успешно импортированы.'))
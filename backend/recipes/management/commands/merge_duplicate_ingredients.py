@@ -0,0 +1,108 @@
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from recipes.generations import bump_generation
+from recipes.models import Ingredient, RecipeIngredient, ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """Команда для слияния ингредиентов с одинаковыми названием и единицей.
+
+    Запускается перед migrate, который добавляет уникальность ингредиентов:
+    ссылки рецептов переносятся на ингредиент с наименьшим id, количества
+    в рецептах, где встречались оба, складываются, а дубликаты удаляются.
+    """
+
+    help = 'Слияние дубликатов ингредиентов перед добавлением уникальности'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только найти дубликаты, не изменяя данные.',
+        )
+
+    def handle(self, *args, **options):
+        if not self.table_exists(Ingredient):
+            self.stdout.write('Таблицы ингредиентов ещё нет.')
+            return
+        duplicates = self.find_duplicates()
+        if options['dry_run'] or not duplicates:
+            self.stdout.write(f'Дубликатов ингредиентов: {len(duplicates)}')
+            return
+        with transaction.atomic():
+            for duplicate_id, original_id in duplicates.items():
+                self.merge_recipes(duplicate_id, original_id)
+            self.rebuild_shopping_lists(duplicates)
+            self.delete_ingredients(duplicates)
+        bump_generation('ingredients', 'recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Объединено дубликатов ингредиентов: {len(duplicates)}.'
+        ))
+
+    def table_exists(self, model):
+        return (
+            model._meta.db_table in connection.introspection.table_names()
+        )
+
+    def find_duplicates(self):
+        """Словарь id дубликата -> id ингредиента, который остаётся."""
+
+        duplicates, previous, original_id = {}, None, None
+        for ingredient_id, *key in Ingredient.objects.order_by(
+            'name', 'measurement_unit', 'id'
+        ).values_list('id', 'name', 'measurement_unit').iterator():
+            if key == previous:
+                duplicates[ingredient_id] = original_id
+            else:
+                previous, original_id = key, ingredient_id
+        return duplicates
+
+    def merge_recipes(self, duplicate_id, original_id):
+        clashing = RecipeIngredient.objects.filter(
+            ingredient_id=duplicate_id,
+            recipe_id__in=RecipeIngredient.objects.filter(
+                ingredient_id=original_id
+            ).values('recipe_id'),
+        )
+        for recipe_id, amount in clashing.values_list('recipe_id', 'amount'):
+            RecipeIngredient.objects.filter(
+                recipe_id=recipe_id, ingredient_id=original_id
+            ).update(amount=F('amount') + amount)
+        clashing.delete()
+        RecipeIngredient.objects.filter(ingredient_id=duplicate_id).update(
+            ingredient_id=original_id
+        )
+
+    def rebuild_shopping_lists(self, duplicates):
+        """Пересчёт списков покупок, если их таблица уже создана."""
+
+        if not self.table_exists(ShoppingListItem):
+            return
+        user_ids = list(
+            ShoppingListItem.objects.filter(
+                ingredient_id__in=list(duplicates)
+            ).values_list('user_id', flat=True).distinct()
+        )
+        if user_ids:
+            ShoppingListItem.objects.rebuild(user_ids)
+
+    def delete_ingredients(self, duplicates):
+        """Удаление дубликатов без каскада.
+
+        Ссылки на них уже перенесены, а таблиц новых моделей до migrate
+        может ещё не быть.
+        """
+
+        ids = list(duplicates)
+        with connection.cursor() as cursor:
+            for start in range(0, len(ids), BATCH_SIZE):
+                batch = ids[start:start + BATCH_SIZE]
+                cursor.execute(
+                    f'DELETE FROM {Ingredient._meta.db_table} '
+                    f'WHERE id IN ({", ".join(["%s"] * len(batch))})',
+                    batch,
+                )
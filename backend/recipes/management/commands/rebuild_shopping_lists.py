@@ -0,0 +1,58 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта и проверки списков покупок."""
+
+    help = 'Пересчёт списков покупок по содержимому корзин'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help=(
+                'Только проверить списки покупок, не изменяя их; при '
+                'расхождениях команда завершается с ошибкой.'
+            ),
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Ограничить пересчёт указанными id пользователей.',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        if not options['verify']:
+            ShoppingListItem.objects.rebuild(user_ids)
+            self.stdout.write(self.style.SUCCESS(
+                'Списки покупок успешно пересчитаны.'
+            ))
+            return
+        broken, broken_users = 0, set()
+        for batch in ShoppingListItem.objects.user_batches(user_ids):
+            actual = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingListItem.objects.filter(
+                    user_id__in=batch
+                ).values_list('user_id', 'ingredient_id', 'amount')
+            }
+            expected = ShoppingListItem.objects.expected(batch)
+            for user_id, ingredient_id in actual.keys() | expected.keys():
+                key = (user_id, ingredient_id)
+                if actual.get(key) != expected.get(key):
+                    broken += 1
+                    broken_users.add(user_id)
+        if broken:
+            raise CommandError(
+                f'Расхождений в списках покупок: {broken}, '
+                f'пользователей: {len(broken_users)}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок совпадают с содержимым корзин.'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+
+from recipes.counters import COUNTERS, reconcile_counter
+
+
+class Command(BaseCommand):
+    """Команда для исправления расхождений в денормализованных счётчиках."""
+
+    help = 'Пересчёт счётчиков избранного, корзин, рецептов и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--counter',
+            choices=COUNTERS,
+            action='append',
+            dest='counters',
+            help='Пересчитать только указанные счётчики.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только найти расхождения, не исправляя их.',
+        )
+
+    def handle(self, *args, **options):
+        for field in options['counters'] or COUNTERS:
+            drifted = reconcile_counter(
+                field, options['batch_size'], options['dry_run']
+            )
+            style = self.style.WARNING if drifted else self.style.SUCCESS
+            self.stdout.write(style(f'{field}: расхождений {drifted}'))
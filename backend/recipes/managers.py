@@ -1,16 +1,224 @@
-from django.db import models
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+RECIPE_COLUMNS = (
+    'name',
+    'image',
+    'text',
+    'cooking_time',
+    'pub_date',
+    'favorites_count',
+    'in_carts_count',
+    'image_derivatives',
+)
+RECIPE_RELATIONS = ('author', 'tags', 'ingredients')
+REBUILD_BATCH_SIZE = 1000
+AUTHOR_COLUMNS = (
+    'author__email',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'author__recipes_count',
+    'author__followers_count',
+)
 
 
 class RecipesRelatedManager(models.Manager):
     """Менеджер для получения списка рецептов со всеми связанными моделями."""
 
     def get_queryset(self):
-        return super().get_queryset().select_related(
-            'author'
-        ).prefetch_related(
-            'tags',
-            'ingredients',
-            'foreign_recipes',
-            'shopping_cart',
-            'favorite_recipe',
+        return self.for_fields(RECIPE_COLUMNS + RECIPE_RELATIONS)
+
+    def for_fields(self, fields):
+        """Рецепты только с полями и связями, нужными для ответа."""
+
+        queryset = super().get_queryset()
+        only = ['id', 'author', 'pub_date', 'updated_at'] + [
+            field for field in RECIPE_COLUMNS if field in fields
+        ]
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+            only += AUTHOR_COLUMNS
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'foreign_recipes',
+                queryset=apps.get_model(
+                    'recipes', 'RecipeIngredient'
+                ).objects.select_related('ingredient'),
+            ))
+        return queryset.only(*only)
+
+    def latest_by_authors(self, author_ids, limit=None):
+        """Последние рецепты каждого автора одним запросом.
+
+        Первые limit рецептов автора отбираются оконной функцией
+        ROW_NUMBER, поэтому число запросов не зависит от числа авторов.
+        """
+
+        author_ids = list(author_ids)
+        recipes = {author_id: [] for author_id in author_ids}
+        if not author_ids:
+            return recipes
+        columns = 'id, name, image, cooking_time, author_id'
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        ranked = (
+            f'SELECT {columns}, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {self.model._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})'
         )
+        params = author_ids
+        condition = ''
+        if limit is not None:
+            condition = 'WHERE position <= %s'
+            params = author_ids + [limit]
+        for recipe in self.raw(
+            f'SELECT {columns} FROM ({ranked}) ranked {condition} '
+            f'ORDER BY author_id, position',
+            params,
+        ):
+            recipes[recipe.author_id].append(recipe)
+        return recipes
+
+
+class ShoppingListManager(models.Manager):
+    """Менеджер для инкрементального обновления списков покупок."""
+
+    def recipe_amounts(self, recipe):
+        """Количество каждого ингредиента рецепта."""
+
+        return dict(
+            recipe.foreign_recipes.values_list('ingredient_id', 'amount')
+        )
+
+    def apply_delta(self, user_ids, deltas):
+        """Изменяет суммы ингредиентов в списках покупок пользователей."""
+
+        user_ids = list(user_ids)
+        deltas = {
+            ingredient_id: amount
+            for ingredient_id, amount in deltas.items() if amount
+        }
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=0,
+                    )
+                    for user_id in user_ids
+                    for ingredient_id, amount in deltas.items() if amount > 0
+                ),
+                ignore_conflicts=True,
+            )
+            self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=deltas,
+            ).update(amount=F('amount') + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(amount))
+                    for ingredient_id, amount in deltas.items()
+                ),
+                output_field=IntegerField(),
+            ))
+            self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=deltas,
+                amount__lte=0,
+            ).delete()
+
+    def add_recipe(self, user, recipe):
+        self.apply_delta([user.id], self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user, recipe):
+        self.apply_delta([user.id], {
+            ingredient_id: -amount
+            for ingredient_id, amount in self.recipe_amounts(recipe).items()
+        })
+
+    def remove_recipe_from_carts(self, recipe):
+        """Убирает рецепт из списков покупок всех пользователей."""
+
+        user_ids = list(recipe.shopping_cart.values_list('user_id', flat=True))
+        if not user_ids:
+            return
+        self.apply_delta(
+            user_ids,
+            {
+                ingredient_id: -amount
+                for ingredient_id, amount
+                in self.recipe_amounts(recipe).items()
+            },
+        )
+
+    def expected(self, user_ids=None):
+        """Суммы ингредиентов, посчитанные по содержимому корзин.
+
+        Условие на корзины задаётся одним filter(): второй filter() по
+        многозначной связи добавил бы ещё одно соединение и умножил суммы.
+        """
+
+        recipe_ingredient = apps.get_model('recipes', 'RecipeIngredient')
+        cart_filter = (
+            {'recipe__shopping_cart__user__isnull': False}
+            if user_ids is None
+            else {'recipe__shopping_cart__user__in': user_ids}
+        )
+        queryset = recipe_ingredient.objects.filter(**cart_filter)
+        return {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in queryset.values(
+                'ingredient_id',
+                user_id=F('recipe__shopping_cart__user'),
+            ).annotate(total=Sum('amount')).order_by()
+        }
+
+    def user_batches(self, user_ids=None):
+        """Пачки id пользователей, списки которых пересчитываются вместе.
+
+        Без user_ids перебираются все пользователи по возрастанию id.
+        """
+
+        if user_ids is not None:
+            user_ids = sorted(set(user_ids))
+            for start in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+                yield user_ids[start:start + REBUILD_BATCH_SIZE]
+            return
+        users = apps.get_model(settings.AUTH_USER_MODEL).objects.order_by('id')
+        batch = list(
+            users.values_list('id', flat=True)[:REBUILD_BATCH_SIZE]
+        )
+        while batch:
+            yield batch
+            batch = list(users.filter(id__gt=batch[-1]).values_list(
+                'id', flat=True
+            )[:REBUILD_BATCH_SIZE])
+
+    def rebuild(self, user_ids=None):
+        """Полностью пересчитывает списки покупок пачками пользователей.
+
+        В памяти держатся суммы только одной пачки.
+        """
+
+        for batch in self.user_batches(user_ids):
+            with transaction.atomic():
+                self.filter(user_id__in=batch).delete()
+                self.bulk_create(
+                    (
+                        self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=total,
+                        )
+                        for (user_id, ingredient_id), total
+                        in self.expected(batch).items()
+                    ),
+                    batch_size=REBUILD_BATCH_SIZE,
+                )
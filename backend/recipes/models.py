@@ -1,12 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import mark_safe
 
-from .managers import RecipesRelatedManager
+from .images import recipe_image_storage
+from .managers import RecipesRelatedManager, ShoppingListManager
 
 MIN_COOKING_TIME = 1
 MIN_INGREDIENT_AMT = 1
@@ -24,6 +27,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient',
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}.'
@@ -79,16 +88,37 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Фото рецепта',
         upload_to='recipes/',
+        storage=recipe_image_storage,
         blank=True,
         null=True
     )
+    image_derivatives = models.JSONField(
+        'Уменьшенные копии фото', default=dict, editable=False
+    )
 
     def image_tag(self):
-        path = '<img src="/media/recipes/%s" width="150" height="150" />'
-        return mark_safe(path % (self.image))
+        if not self.image:
+            return ''
+        thumb = self.image_derivatives.get('thumb', {}).get('jpeg')
+        url = self.image.storage.url(thumb) if thumb else self.image.url
+        path = '<img src="%s" width="150" height="150" />'
+        return mark_safe(path % url)
 
     image_tag.short_description = 'Image'
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField(
+        'Дата изменения', default=timezone.now, editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False
+    )
+    merged_on_read = models.BooleanField(
+        'Подмешивается в ленты при чтении', default=False, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
     objects = models.Manager()
     recipes_related = RecipesRelatedManager()
 
@@ -96,6 +126,21 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                condition=models.Q(merged_on_read=True),
+                name='recipe_merged_on_read_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.author.email}, {self.name}'
@@ -158,6 +203,12 @@ class Subscribe(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-id'],
+                name='subscribe_user_created_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
@@ -228,3 +279,77 @@ class ShoppingCart(models.Model):
     def create_shopping_cart(sender, instance, created, **kwargs):
         if created:
             return ShoppingCart.objects.create(user=instance)
+
+
+class ShoppingListItem(models.Model):
+    """Модель строки списка покупок с суммарным количеством ингредиента."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField('Количество', default=0)
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """Модель записи ленты подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
@@ -0,0 +1,226 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+SQLITE_WEIGHTS = '10.0, 5.0, 1.0'
+
+POSTGRESQL_SQL = (
+    '''
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{config}', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('{config}', coalesce((
+                SELECT string_agg(i.name, ' ')
+                FROM recipes_recipeingredient ri
+                JOIN recipes_ingredient i ON i.id = ri.ingredient_id
+                WHERE ri.recipe_id = NEW.id
+            ), '')), 'B')
+            || setweight(to_tsvector('{config}', coalesce(NEW.text, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON recipes_recipe',
+    '''
+    CREATE TRIGGER recipes_recipe_search_vector
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector()
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_recipeingredient_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE recipes_recipe SET name = name
+            WHERE id IN (SELECT recipe_id FROM old_rows);
+        ELSE
+            UPDATE recipes_recipe SET name = name
+            WHERE id IN (SELECT recipe_id FROM new_rows);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS recipes_recipeingredient_search_insert
+    ON recipes_recipeingredient
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipeingredient_search_insert
+    AFTER INSERT ON recipes_recipeingredient
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE recipes_recipeingredient_search_vector()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS recipes_recipeingredient_search_delete
+    ON recipes_recipeingredient
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipeingredient_search_delete
+    AFTER DELETE ON recipes_recipeingredient
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE recipes_recipeingredient_search_vector()
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_ingredient_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe SET name = name WHERE id IN (
+            SELECT recipe_id FROM recipes_recipeingredient
+            WHERE ingredient_id = NEW.id
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS recipes_ingredient_search ON recipes_ingredient',
+    '''
+    CREATE TRIGGER recipes_ingredient_search
+    AFTER UPDATE OF name ON recipes_ingredient
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE recipes_ingredient_search_vector()
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector)
+    ''',
+    'UPDATE recipes_recipe SET name = name WHERE search_vector IS NULL',
+)
+
+SQLITE_INGREDIENTS = '''
+    SELECT group_concat(i.name, ' ')
+    FROM recipes_recipeingredient ri
+    JOIN recipes_ingredient i ON i.id = ri.ingredient_id
+    WHERE ri.recipe_id = {recipe_id}
+'''
+
+SQLITE_SQL = (
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(name, ingredients, text, tokenize = 'unicode61')
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text)
+        VALUES (
+            NEW.id,
+            NEW.name,
+            ({SQLITE_INGREDIENTS.format(recipe_id='NEW.id')}),
+            NEW.text
+        );
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        UPDATE {FTS_TABLE} SET name = NEW.name, text = NEW.text
+        WHERE rowid = NEW.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipeingredient_fts_insert
+    AFTER INSERT ON recipes_recipeingredient BEGIN
+        UPDATE {FTS_TABLE}
+        SET ingredients = ({SQLITE_INGREDIENTS.format(
+            recipe_id='NEW.recipe_id'
+        )})
+        WHERE rowid = NEW.recipe_id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipeingredient_fts_delete
+    AFTER DELETE ON recipes_recipeingredient BEGIN
+        UPDATE {FTS_TABLE}
+        SET ingredients = ({SQLITE_INGREDIENTS.format(
+            recipe_id='OLD.recipe_id'
+        )})
+        WHERE rowid = OLD.recipe_id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_ingredient_fts_update
+    AFTER UPDATE OF name ON recipes_ingredient BEGIN
+        UPDATE {FTS_TABLE}
+        SET ingredients = ({SQLITE_INGREDIENTS.format(
+            recipe_id=f'{FTS_TABLE}.rowid'
+        )})
+        WHERE rowid IN (
+            SELECT recipe_id FROM recipes_recipeingredient
+            WHERE ingredient_id = NEW.id
+        );
+    END
+    ''',
+    f'DELETE FROM {FTS_TABLE}',
+    f'''
+    INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text)
+    SELECT
+        recipes_recipe.id,
+        recipes_recipe.name,
+        ({SQLITE_INGREDIENTS.format(recipe_id='recipes_recipe.id')}),
+        recipes_recipe.text
+    FROM recipes_recipe
+    ''',
+)
+
+
+def install_search(sender, using, **kwargs):
+    """Создаёт триггеры и индексы полнотекстового поиска после миграций."""
+
+    connection = connections[using]
+    statements = {
+        'postgresql': [
+            sql.format(config=SEARCH_CONFIG) for sql in POSTGRESQL_SQL
+        ],
+        'sqlite': SQLITE_SQL,
+    }.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, найденные по названию, описанию и ингредиентам.
+
+    Результаты упорядочены по релевантности.
+    """
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date')
+    if vendor == 'sqlite':
+        match = ' '.join(
+            f'"{token}"*' for token in re.findall(r'\w+', query)
+        )
+        if not match:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,),
+        )).annotate(rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {SQLITE_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = recipes_recipe.id',
+            (match,),
+        )).order_by('rank', '-pub_date')
+    return queryset.filter(name__icontains=query)
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .generations import bump_generation, user_generation
+from .ingredient_index import ingredient_index
+from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Subscribe, Tag)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+    bump_generation('ingredients', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_generation(sender, **kwargs):
+    bump_generation('tags', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def bump_recipe_ingredients_generation(sender, **kwargs):
+    bump_generation('recipes')
+
+
+@receiver((post_save, post_delete), sender=settings.AUTH_USER_MODEL)
+def bump_authors_generation(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    bump_generation('users', 'recipes')
+
+
+@receiver(m2m_changed, sender=FavoriteRecipe.recipe.through)
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def bump_collection_owner_generation(sender, instance, action, reverse,
+                                     model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_generation(user_generation(instance.user_id))
+    elif pk_set:
+        bump_generation(*(
+            user_generation(user_id)
+            for user_id in model.objects.filter(
+                pk__in=pk_set
+            ).values_list('user_id', flat=True)
+        ))
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def bump_subscriber_generation(sender, instance, **kwargs):
+    bump_generation(user_generation(instance.user_id))
+
+
+@receiver(pre_save, sender=Recipe)
+def touch_recipe(sender, instance, raw=False, **kwargs):
+    """Обновляет дату изменения рецепта, кроме загрузки из фикстур."""
+
+    if not raw:
+        instance.updated_at = timezone.now()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def bump_recipes_generation(sender, **kwargs):
+    bump_generation('recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_generation(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_generation('recipes')
@@ -0,0 +1,102 @@
+from itertools import islice
+
+from django.conf import settings
+from jobs.registry import job
+
+from .generations import bump_generation
+from .images import create_derivatives
+from .models import Recipe, Subscribe, TimelineEntry
+
+
+def is_fanned_out(followers_count):
+    """Раздаются ли рецепты автора по лентам подписчиков при публикации."""
+
+    return followers_count <= settings.TIMELINE_FANOUT_THRESHOLD
+
+
+@job
+def fan_out_recipe(recipe_id, author_id, followers_count):
+    """Записывает новый рецепт в ленты подписчиков автора пачками.
+
+    До этого рецепт подмешивается в ленты при чтении. Рецепты авторов
+    с очень большим числом подписчиков в ленты не записываются и остаются
+    подмешиваемыми, даже если подписчиков потом станет меньше.
+    """
+
+    if not is_fanned_out(followers_count):
+        return
+    follower_ids = Subscribe.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator(
+        chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE
+    )
+    batch = list(islice(follower_ids, settings.TIMELINE_FANOUT_BATCH_SIZE))
+    while batch:
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, recipe_id=recipe_id, author_id=author_id
+                )
+                for user_id in batch
+            ),
+            ignore_conflicts=True,
+        )
+        batch = list(
+            islice(follower_ids, settings.TIMELINE_FANOUT_BATCH_SIZE)
+        )
+    Recipe.objects.filter(id=recipe_id).update(merged_on_read=False)
+
+
+@job
+def fan_out_recipes(recipe_ids, author_id, followers_count):
+    for recipe_id in recipe_ids:
+        fan_out_recipe(recipe_id, author_id, followers_count)
+
+
+@job
+def backfill_timelines(subscriptions):
+    """Добавляет в ленты последние рецепты авторов из пар (подписчик, автор).
+
+    Возвращает число добавленных записей.
+    """
+
+    subscriptions = list(subscriptions)
+    recipes_by_author = Recipe.recipes_related.latest_by_authors(
+        {author_id for _, author_id in subscriptions},
+        settings.TIMELINE_BACKFILL_SIZE,
+    )
+    entries = [
+        TimelineEntry(
+            user_id=user_id, recipe_id=recipe.id, author_id=author_id
+        )
+        for user_id, author_id in subscriptions
+        for recipe in recipes_by_author[author_id]
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return len(entries)
+
+
+@job
+def generate_image_derivatives(recipe_ids):
+    """Создаёт уменьшенные копии фото рецептов и сохраняет их имена.
+
+    Если фото успели заменить, результат для старого фото отбрасывается.
+    """
+
+    updated = 0
+    for recipe in Recipe.objects.filter(id__in=recipe_ids).only('image'):
+        if not recipe.image:
+            continue
+        derivatives = create_derivatives(
+            recipe.image.storage, recipe.image.name
+        )
+        updated += Recipe.objects.filter(
+            id=recipe.id, image=recipe.image.name
+        ).update(image_derivatives=derivatives)
+    if updated:
+        bump_generation('recipes')
+    return updated
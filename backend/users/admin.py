@@ -15,6 +15,8 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'date_joined',
+        'recipes_count',
+        'followers_count',
     )
     search_fields = ('email', 'username', 'first_name', 'last_name')
     list_filter = ('date_joined', 'email', 'first_name')
@@ -11,6 +11,12 @@ class User(AbstractUser):
     email = models.EmailField('Email', max_length=255, unique=True)
     first_name = models.CharField('Имя', max_length=192)
     last_name = models.CharField('Фамилия', max_length=192)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь'